@@ -0,0 +1,235 @@
+"""Single-pass chart pipeline.
+
+The dataset is read once, every aggregate the charts need is computed from
+that one DataFrame, and each chart is rendered from its aggregate only.
+Rendering uses matplotlib's object API (no pyplot state), so charts can be
+drawn in parallel worker processes.
+
+Each chart's input aggregate is hashed together with the chart's style
+version and recorded in `.chart_manifest.json` in the output directory.
+A chart whose hash is unchanged and whose files still exist is skipped,
+so regenerating report charts for many households only redraws what
+changed.
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import pandas as pd
+
+MANIFEST = '.chart_manifest.json'
+DEVICES = {'AC_Unit': 'AC Unit', 'Fan': 'Fan', 'Heater': 'Heater'}
+COLORS = ['#1FB8CD', '#DB4545', '#2E8B57', '#5D878F', '#D2BA4C']
+
+
+def load(path):
+    return pd.read_csv(path, parse_dates=['Timestamp'])
+
+
+def aggregate(df):
+    """Compute every chart input from one pass over the raw readings."""
+    ts = pd.to_datetime(df['Timestamp'])
+    energy_cols = [f'{d}_Energy_kWh' for d in DEVICES] + ['Total_Energy_kWh']
+    power_cols = [f'{d}_Power_W' for d in DEVICES] + ['Total_Power_W']
+
+    daily = df.groupby(ts.dt.normalize().rename('Date'))[energy_cols].sum()
+    hourly = df.groupby(ts.dt.hour.rename('Hour'))[power_cols].mean()
+    day_of_month = df.groupby(ts.dt.day.rename('Day'))['Total_Energy_kWh'].sum()
+    device_energy = pd.Series(
+        {label: df[f'{d}_Energy_kWh'].sum() for d, label in DEVICES.items()},
+        name='Energy_kWh',
+    )
+    numeric = df[power_cols + ['Total_Energy_kWh']].assign(
+        Hour=ts.dt.hour, Day_of_Week=ts.dt.dayofweek)
+    correlation = numeric[['Total_Power_W', 'AC_Unit_Power_W', 'Fan_Power_W', 'Heater_Power_W',
+                           'Hour', 'Day_of_Week', 'Total_Energy_kWh']].corr()
+    return {
+        'daily': daily,
+        'hourly': hourly,
+        'day_of_month': day_of_month,
+        'device_energy': device_energy,
+        'correlation': correlation,
+    }
+
+
+# Renderers: each takes its aggregate and returns a matplotlib Figure
+
+def _figure(size):
+    from matplotlib.figure import Figure
+    return Figure(figsize=size)
+
+
+def _line(series, title, xlabel, ylabel):
+    fig = _figure((12, 6))
+    ax = fig.subplots()
+    ax.plot(series.index, series.values, marker='o')
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.grid(True)
+    return fig
+
+
+def render_daily_energy_pattern(day_of_month):
+    return _line(day_of_month, 'Daily Total Energy Consumption Pattern', 'Day of Month', 'Total Energy (kWh)')
+
+
+def render_daily_consumption_pattern(day_of_month):
+    return _line(day_of_month, 'Daily Energy Consumption Pattern', 'Day of Month', 'Total Energy (kWh)')
+
+
+def render_hourly_power_pattern(hourly):
+    return _line(hourly['Total_Power_W'], 'Average Hourly Power Usage Pattern', 'Hour of Day', 'Average Power (W)')
+
+
+def render_device_energy_distribution(device_energy):
+    fig = _figure((10, 8))
+    ax = fig.subplots()
+    ax.pie(device_energy.values, labels=device_energy.index, autopct='%1.1f%%')
+    ax.set_title('Device-wise Energy Consumption Distribution')
+    return fig
+
+
+def render_correlation_heatmap(correlation):
+    fig = _figure((12, 10))
+    ax = fig.subplots()
+    image = ax.imshow(correlation.values, cmap='coolwarm', vmin=-1, vmax=1)
+    labels = list(correlation.columns)
+    ax.set_xticks(range(len(labels)), labels, rotation=45, ha='right')
+    ax.set_yticks(range(len(labels)), labels)
+    for i in range(len(labels)):
+        for j in range(len(labels)):
+            ax.text(j, i, f'{correlation.values[i, j]:.2f}', ha='center', va='center')
+    fig.colorbar(image, ax=ax)
+    ax.set_title('Correlation Heatmap')
+    fig.tight_layout()
+    return fig
+
+
+def render_power_consumption_chart(hourly):
+    fig = _figure((12, 6))
+    ax = fig.subplots()
+    styles = ['-', '--', ':', '-.']
+    columns = [f'{d}_Power_W' for d in DEVICES] + ['Total_Power_W']
+    for color, style, column, label in zip(COLORS, styles, columns, list(DEVICES.values()) + ['Total']):
+        ax.plot(hourly.index, hourly[column], style, color=color, linewidth=2, label=label)
+    ax.set_title('Hourly Power Consumption - Sept 2025')
+    ax.set_xlabel('Hour')
+    ax.set_ylabel('Power (W)')
+    ax.set_xticks(range(0, 24, 2))
+    ax.grid(True, color='lightgray')
+    ax.legend(loc='lower center', bbox_to_anchor=(0.5, 1.05), ncol=4, frameon=False)
+    fig.tight_layout()
+    return fig
+
+
+def render_energy_consumption_chart(daily):
+    fig = _figure((12, 6))
+    ax = fig.subplots()
+    for i, (device, label) in enumerate(list(DEVICES.items()) + [('Total', 'Total')]):
+        ax.plot(daily.index, daily[f'{device}_Energy_kWh'], color=COLORS[i],
+                linewidth=3 if device == 'Total' else 2, label=label)
+    ax.set_title('Daily Energy Consumption - September 2025')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Energy (kWh)')
+    ax.grid(True)
+    ax.legend(loc='lower center', bbox_to_anchor=(0.5, 1.05), ncol=4, frameon=False)
+    fig.autofmt_xdate()
+    fig.tight_layout()
+    return fig
+
+
+def render_energy_pie_chart(device_energy):
+    fig = _figure((8, 8))
+    ax = fig.subplots()
+    total = device_energy.sum()
+    labels = [f'{kwh:.2f}kWh\n{kwh / total * 100:.1f}%' for kwh in device_energy.values]
+    ax.pie(device_energy.values, labels=labels, colors=['#1FB8CD', '#2E8B57', '#DB4545'],
+           labeldistance=0.6, textprops={'fontsize': 14})
+    ax.legend(device_energy.index, loc='upper right')
+    ax.set_title('Device Energy Sep 2025')
+    return fig
+
+
+@dataclass(frozen=True)
+class Chart:
+    name: str
+    source: str
+    render: object
+    formats: tuple = ('png',)
+    # Bump when the rendering changes so cached images are redrawn
+    version: int = 1
+
+
+CHARTS = [
+    Chart('daily_energy_pattern', 'day_of_month', render_daily_energy_pattern),
+    Chart('daily_consumption_pattern', 'day_of_month', render_daily_consumption_pattern),
+    Chart('hourly_power_pattern', 'hourly', render_hourly_power_pattern),
+    Chart('device_energy_distribution', 'device_energy', render_device_energy_distribution),
+    Chart('correlation_heatmap', 'correlation', render_correlation_heatmap),
+    Chart('power_consumption_chart', 'hourly', render_power_consumption_chart, ('png', 'svg')),
+    Chart('energy_consumption_chart', 'daily', render_energy_consumption_chart, ('png', 'svg')),
+    Chart('energy_pie_chart', 'device_energy', render_energy_pie_chart, ('png', 'svg')),
+]
+CHARTS_BY_NAME = {chart.name: chart for chart in CHARTS}
+
+
+def content_hash(chart, data):
+    digest = hashlib.sha256(f'{chart.name}:{chart.version}:{chart.formats}\n'.encode())
+    digest.update(data.to_csv().encode())
+    return digest.hexdigest()
+
+
+def _render_one(chart_name, data, out_dir):
+    chart = CHARTS_BY_NAME[chart_name]
+    fig = chart.render(data)
+    paths = []
+    for fmt in chart.formats:
+        path = Path(out_dir) / f'{chart.name}.{fmt}'
+        fig.savefig(path, format=fmt)
+        paths.append(str(path))
+    return paths
+
+
+def render(aggregates, out_dir='.', names=None, jobs=None, force=False):
+    """Render charts from precomputed aggregates, skipping unchanged ones.
+
+    Returns (rendered, skipped) lists of chart names.
+    """
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_dir / MANIFEST
+    manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+
+    charts = [CHARTS_BY_NAME[n] for n in names] if names else CHARTS
+    todo, skipped = [], []
+    for chart in charts:
+        digest = content_hash(chart, aggregates[chart.source])
+        outputs_exist = all((out_dir / f'{chart.name}.{fmt}').exists() for fmt in chart.formats)
+        if not force and manifest.get(chart.name) == digest and outputs_exist:
+            skipped.append(chart.name)
+        else:
+            todo.append((chart, digest))
+
+    jobs = min(jobs or os.cpu_count() or 1, len(todo))
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(_render_one, c.name, aggregates[c.source], str(out_dir)) for c, _ in todo]
+            for future in futures:
+                future.result()
+    else:
+        for chart, _ in todo:
+            _render_one(chart.name, aggregates[chart.source], out_dir)
+
+    for chart, digest in todo:
+        manifest[chart.name] = digest
+    manifest_path.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    return [c.name for c, _ in todo], skipped
+
+
+def render_dataset(path, out_dir='.', names=None, jobs=None, force=False):
+    return render(aggregate(load(path)), out_dir, names=names, jobs=jobs, force=force)
@@ -0,0 +1,210 @@
+"""Command-line entry point for the analytics scripts.
+
+    python cli.py summary   [--data CSV]       totals via the csv module, no pandas
+    python cli.py advise    [--data CSV]       EnergyAdvisor recommendations
+    python cli.py analyze   [--data CSV]       usage statistics and pattern charts
+    python cli.py train     [--data CSV]       random forest power model
+    python cli.py charts    [--data CSV] [--out DIR] [--jobs N] [--force]
+                                               render every chart, skipping unchanged ones
+    python cli.py summaries [--data CSV] [--out DIR]
+                                               fold new readings into the daily/hourly summaries
+    python cli.py validate  [--data CSV|PARQUET] [--chunksize N] [--json]
+                                               data-quality report; exit status 1 on violations
+
+advise, analyze, train, charts and summaries accept --validate to refuse
+to run on a dataset that fails the checks. summaries validates only the
+rows it has not folded in yet, not the whole file.
+
+Heavy libraries (pandas, numpy, sklearn, matplotlib) are imported
+inside the subcommand that needs them, and matplotlib is pinned to the
+headless Agg backend. Pass --timings to print an import-time breakdown.
+"""
+import argparse
+import importlib
+import os
+import sys
+import time
+from pathlib import Path
+
+_STARTED = time.perf_counter()
+HERE = Path(__file__).resolve().parent
+DEFAULT_DATASET = HERE / 'september_2025_power_usage_dataset (1).csv'
+
+# Cron jobs have no display; never let matplotlib probe for one
+os.environ.setdefault('MPLBACKEND', 'Agg')
+if str(HERE) not in sys.path:
+    sys.path.insert(0, str(HERE))
+
+_import_times = {}
+
+
+def timed_import(name):
+    """Import a module and record how long it took if it was not loaded yet."""
+    if name in sys.modules:
+        return sys.modules[name]
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    _import_times[name] = time.perf_counter() - start
+    return module
+
+
+def report_timings():
+    total = time.perf_counter() - _STARTED
+    imports = sum(_import_times.values())
+    print('\nImport-time breakdown:', file=sys.stderr)
+    for name, seconds in sorted(_import_times.items(), key=lambda kv: -kv[1]):
+        print(f'  {name:<24} {seconds * 1000:8.1f} ms', file=sys.stderr)
+    print(f'  {"(imports total)":<24} {imports * 1000:8.1f} ms', file=sys.stderr)
+    print(f'  {"(wall total)":<24} {total * 1000:8.1f} ms', file=sys.stderr)
+
+
+def cmd_summary(args):
+    import csv
+
+    readings = 0
+    total_kwh = 0.0
+    peak_w = 0.0
+    devices = {'AC_Unit': 0.0, 'Fan': 0.0, 'Heater': 0.0}
+    with open(args.data, newline='') as f:
+        for row in csv.DictReader(f):
+            readings += 1
+            total_kwh += float(row['Total_Energy_kWh'])
+            peak_w = max(peak_w, float(row['Total_Power_W']))
+            for device in devices:
+                devices[device] += float(row[f'{device}_Energy_kWh'])
+    print(f'Readings: {readings}')
+    print(f'Total energy: {total_kwh:.2f} kWh')
+    print(f'Peak power: {peak_w:.2f} W')
+    for device, kwh in devices.items():
+        print(f'{device}: {kwh:.2f} kWh')
+
+
+def cmd_advise(args):
+    timed_import('pandas')
+    timed_import('matplotlib')
+    energy_advisor = timed_import('energy_advisor')
+    energy_advisor.main(str(args.data))
+
+
+def cmd_analyze(args):
+    timed_import('pandas')
+    timed_import('matplotlib')
+    analysis = timed_import('power_usage_analysis')
+    df = analysis.load_and_preprocess_data(args.data)
+    _, _, energy_by_device = analysis.analyze_patterns(df)
+    print(f"Total number of readings: {len(df)}")
+    print(f"Time period: {df['Timestamp'].min()} to {df['Timestamp'].max()}")
+    print(f"Average total power: {df['Total_Power_W'].mean():.2f} W")
+    print(f"Maximum total power: {df['Total_Power_W'].max():.2f} W")
+    for device, energy in energy_by_device.items():
+        print(f"{device}: {energy:.2f} kWh")
+
+
+def cmd_train(args):
+    timed_import('pandas')
+    timed_import('sklearn.ensemble')
+    analysis = timed_import('power_usage_analysis')
+    df = analysis.load_and_preprocess_data(args.data)
+    _, rmse, r2, feature_importance = analysis.train_model(df)
+    print(f"Root Mean Squared Error: {rmse:.2f} W")
+    print(f"R-squared Score: {r2:.4f}")
+    print(feature_importance.to_string(index=False))
+
+
+def cmd_charts(args):
+    timed_import('pandas')
+    timed_import('matplotlib')
+    charts = timed_import('charts')
+    rendered, skipped = charts.render_dataset(args.data, args.out, jobs=args.jobs, force=args.force)
+    print(f"Rendered {len(rendered)} chart(s), {len(skipped)} unchanged, in {args.out}")
+    for name in rendered:
+        print(f"  {name}")
+
+
+def cmd_summaries(args):
+    timed_import('pandas')
+    summaries = timed_import('summaries')
+    validate = timed_import('validate')
+    try:
+        written = summaries.update(args.data, args.out, check=args.validate)
+    except validate.ValidationFailed as exc:
+        print(f'{args.data} failed validation, not running summaries:', file=sys.stderr)
+        print(exc.report, file=sys.stderr)
+        return 1
+    except ValueError as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    print(f"Updated {len(written)} summary file(s) in {args.out}")
+    for path in written:
+        print(f"  {path.name}")
+
+
+def cmd_validate(args):
+    timed_import('pandas')
+    validate = timed_import('validate')
+    report = validate.validate(args.data, chunksize=args.chunksize)
+    if args.json:
+        import json
+        print(json.dumps(report.to_dict(), indent=2))
+    else:
+        print(report)
+    return 0 if report.ok else 1
+
+
+def gate(args):
+    """Validate the input first when --validate is given; return an exit status to stop with."""
+    # summaries validates only its new rows itself
+    if not getattr(args, 'validate', False) or args.command == 'summaries':
+        return None
+    timed_import('pandas')
+    report = timed_import('validate').validate(args.data)
+    if report.ok:
+        return None
+    print(f'{args.data} failed validation, not running {args.command}:', file=sys.stderr)
+    print(report, file=sys.stderr)
+    return 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='analytics', description='Smart meter analytics')
+    parser.add_argument('--timings', action='store_true', help='print import-time breakdown to stderr')
+    sub = parser.add_subparsers(dest='command', required=True)
+    for name, func, help_text in [
+        ('summary', cmd_summary, 'quick totals without heavy imports'),
+        ('advise', cmd_advise, 'energy-saving recommendations'),
+        ('analyze', cmd_analyze, 'usage statistics and pattern charts'),
+        ('train', cmd_train, 'train the power prediction model'),
+        ('charts', cmd_charts, 'render pattern charts'),
+        ('summaries', cmd_summaries, 'update daily-summary and hourly-pattern datasets'),
+        ('validate', cmd_validate, 'check a dataset against the data-quality rules'),
+    ]:
+        cmd = sub.add_parser(name, help=help_text)
+        cmd.add_argument('--data', type=Path, default=DEFAULT_DATASET, help='raw readings file')
+        cmd.set_defaults(func=func)
+        if name in ('charts', 'summaries'):
+            cmd.add_argument('--out', type=Path, default=Path('.'), help='output directory')
+        if name == 'charts':
+            cmd.add_argument('--jobs', type=int, default=None, help='parallel render processes')
+            cmd.add_argument('--force', action='store_true', help='ignore the content-hash cache')
+        if name == 'validate':
+            cmd.add_argument('--chunksize', type=int, default=250_000, help='rows per streamed chunk')
+            cmd.add_argument('--json', action='store_true', help='print the report as JSON')
+        elif name != 'summary':
+            cmd.add_argument('--validate', action='store_true', help='validate the dataset first')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        stopped = gate(args)
+        if stopped is not None:
+            return stopped
+        return args.func(args)
+    finally:
+        if args.timings:
+            report_timings()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,6 @@
 import pandas as pd
-import numpy as np
-from sklearn.cluster import KMeans
-import matplotlib.pyplot as plt
-from datetime import datetime
+
+DEFAULT_DATASET = 'september_2025_power_usage_dataset (1).csv'
 
 class EnergyAdvisor:
     def __init__(self, data_file):
@@ -324,23 +322,17 @@ class EnergyAdvisor:
         
         return recommendations
 
-    def plot_daily_patterns(self):
+    def plot_daily_patterns(self, out_dir='.'):
         """Plot daily energy consumption patterns"""
-        plt.figure(figsize=(12, 6))
-        daily_usage = self.df.groupby('Day')['Total_Energy_kWh'].sum()
-        plt.plot(daily_usage.index, daily_usage.values, marker='o')
-        plt.title('Daily Energy Consumption Pattern')
-        plt.xlabel('Day of Month')
-        plt.ylabel('Total Energy (kWh)')
-        plt.grid(True)
-        plt.savefig('daily_consumption_pattern.png')
-        plt.close()
-        
-        return daily_usage
+        import charts
+
+        aggregates = charts.aggregate(self.df)
+        charts.render(aggregates, out_dir, names=['daily_consumption_pattern'])
+        return aggregates['day_of_month']
 
-def main():
+def main(data_file=DEFAULT_DATASET):
     # Initialize the advisor
-    advisor = EnergyAdvisor('september_2025_power_usage_dataset (1).csv')
+    advisor = EnergyAdvisor(data_file)
     
     # Generate recommendations
     recommendations = advisor.generate_recommendations()
@@ -1,12 +1,7 @@
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.metrics import mean_squared_error, r2_score
-import matplotlib.pyplot as plt
-import seaborn as sns
-from datetime import datetime
+
+DEFAULT_DATASET = 'september_2025_power_usage_dataset (1).csv'
 
 # Set random seed for reproducibility
 np.random.seed(42)
@@ -27,58 +22,30 @@ def load_and_preprocess_data(filepath):
     return df
 
 # Analyze patterns and create visualizations
-def analyze_patterns(df):
-    # Set style
-    plt.style.use('seaborn-v0_8')
-    
-    # Daily total energy consumption pattern
-    plt.figure(figsize=(12, 6))
-    daily_usage = df.groupby(df['Timestamp'].dt.day)['Total_Energy_kWh'].sum()
-    plt.plot(daily_usage.index, daily_usage.values, marker='o')
-    plt.title('Daily Total Energy Consumption Pattern')
-    plt.xlabel('Day of Month')
-    plt.ylabel('Total Energy (kWh)')
-    plt.grid(True)
-    plt.savefig('daily_energy_pattern.png')
-    plt.close()
-    
-    # Average hourly power usage pattern
-    plt.figure(figsize=(12, 6))
-    hourly_power = df.groupby('Hour')['Total_Power_W'].mean()
-    plt.plot(hourly_power.index, hourly_power.values, marker='o')
-    plt.title('Average Hourly Power Usage Pattern')
-    plt.xlabel('Hour of Day')
-    plt.ylabel('Average Power (W)')
-    plt.grid(True)
-    plt.savefig('hourly_power_pattern.png')
-    plt.close()
-    
-    # Device-wise energy consumption pie chart
-    plt.figure(figsize=(10, 8))
-    energy_by_device = {
-        'AC Unit': df['AC_Unit_Energy_kWh'].sum(),
-        'Fan': df['Fan_Energy_kWh'].sum(),
-        'Heater': df['Heater_Energy_kWh'].sum()
-    }
-    plt.pie(energy_by_device.values(), labels=energy_by_device.keys(), autopct='%1.1f%%')
-    plt.title('Device-wise Energy Consumption Distribution')
-    plt.savefig('device_energy_distribution.png')
-    plt.close()
-    
-    # Create correlation heatmap
-    plt.figure(figsize=(12, 10))
-    numeric_cols = ['Total_Power_W', 'AC_Unit_Power_W', 'Fan_Power_W', 'Heater_Power_W', 
-                   'Hour', 'Day_of_Week', 'Total_Energy_kWh']
-    correlation = df[numeric_cols].corr()
-    sns.heatmap(correlation, annot=True, cmap='coolwarm', fmt='.2f')
-    plt.title('Correlation Heatmap')
-    plt.savefig('correlation_heatmap.png')
-    plt.close()
-    
+def analyze_patterns(df, out_dir='.'):
+    # Aggregates come from one pass over df; the chart pipeline renders from them
+    import charts
+
+    aggregates = charts.aggregate(df)
+    charts.render(aggregates, out_dir, names=[
+        'daily_energy_pattern',
+        'hourly_power_pattern',
+        'device_energy_distribution',
+        'correlation_heatmap',
+    ])
+
+    daily_usage = aggregates['day_of_month']
+    hourly_power = aggregates['hourly']['Total_Power_W']
+    energy_by_device = aggregates['device_energy'].to_dict()
     return daily_usage, hourly_power, energy_by_device
 
 # Train machine learning model
 def train_model(df):
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.metrics import mean_squared_error, r2_score
+
     # Prepare features and target
     features = ['Hour', 'Day', 'Day_of_Week', 'AC_Unit_Power_W', 'Fan_Power_W', 'Heater_Power_W']
     X = df[features]
@@ -113,10 +80,10 @@ def train_model(df):
     return model, rmse, r2, feature_importance
 
 # Main analysis
-def main():
+def main(filepath=DEFAULT_DATASET):
     # Load and preprocess data
     print("Loading and preprocessing data...")
-    df = load_and_preprocess_data('september_2025_power_usage_dataset (1).csv')
+    df = load_and_preprocess_data(filepath)
     
     # Analyze patterns
     print("\nAnalyzing patterns...")
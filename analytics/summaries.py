@@ -0,0 +1,158 @@
+"""Daily-summary and hourly-pattern datasets derived from raw readings.
+
+Produces, per calendar month of the raw dataset, the same files that used to
+be hand-made:
+
+    <month>_<year>_daily_summary.csv     Date, per-device daily kWh, total kWh,
+                                         average and peak total power
+    <month>_<year>_hourly_patterns.csv   Hour, per-device and total mean power
+
+`update()` is incremental for append-only raw files. It remembers (in
+`.summary_state.json` next to the outputs) the byte offset where the last,
+possibly incomplete, day starts, plus per-hour power sums and counts for
+every completed day. A run reads only the bytes from that offset on,
+rewrites the open day and folds newly completed days into the sums, so
+history is never rescanned. Run one output directory per customer.
+
+Rows must arrive in date order. A re-sent row for a day before the saved
+open day cannot be folded in without rescanning that day, so `update()`
+raises ValueError and writes nothing. Delete `.summary_state.json` and the
+outputs to rebuild from the whole file.
+"""
+import io
+import json
+from pathlib import Path
+
+import pandas as pd
+
+STATE = '.summary_state.json'
+DEVICES = ['AC_Unit', 'Fan', 'Heater']
+POWER_COLS = [f'{d}_Power_W' for d in DEVICES] + ['Total_Power_W']
+DAILY_COLS = ['Date', 'AC_Daily_kWh', 'Fan_Daily_kWh', 'Heater_Daily_kWh',
+              'Total_Daily_kWh', 'Avg_Power_W', 'Peak_Power_W']
+
+
+def period_label(ts):
+    # Matches the existing artifact names, e.g. september_2025
+    return ts.strftime('%B_%Y').lower()
+
+
+def daily_summary(df):
+    """Daily per-device kWh, total kWh, average and peak power."""
+    ts = pd.to_datetime(df['Timestamp'])
+    grouped = df.groupby(ts.dt.strftime('%Y-%m-%d').rename('Date'))
+    out = pd.DataFrame({
+        'AC_Daily_kWh': grouped['AC_Unit_Energy_kWh'].sum(),
+        'Fan_Daily_kWh': grouped['Fan_Energy_kWh'].sum(),
+        'Heater_Daily_kWh': grouped['Heater_Energy_kWh'].sum(),
+        'Total_Daily_kWh': grouped['Total_Energy_kWh'].sum(),
+        'Avg_Power_W': grouped['Total_Power_W'].mean(),
+        'Peak_Power_W': grouped['Total_Power_W'].max(),
+    })
+    return out.round(2).reset_index()[DAILY_COLS]
+
+
+def hourly_patterns(df):
+    """Hour-of-day mean power per device and in total."""
+    ts = pd.to_datetime(df['Timestamp'])
+    return df.groupby(ts.dt.hour.rename('Hour'))[POWER_COLS].mean().round(2).reset_index()
+
+
+def _hourly_sums(df):
+    # Per-hour sums and counts, the mergeable form of hourly_patterns
+    hours = pd.to_datetime(df['Timestamp']).dt.hour
+    grouped = df.groupby(hours)[POWER_COLS]
+    sums = grouped.sum().reindex(range(24), fill_value=0.0)
+    counts = grouped.size().reindex(range(24), fill_value=0)
+    return sums, counts
+
+
+def _read_new_rows(raw_path, offset):
+    """Read complete rows from `offset` on; return (df, byte offset of each row)."""
+    with open(raw_path, 'rb') as f:
+        header = f.readline()
+        start = max(offset, f.tell())
+        f.seek(start)
+        chunk = f.read()
+    # Leave a partially written trailing line for the next run
+    chunk = chunk[:chunk.rfind(b'\n') + 1]
+    lines = chunk.splitlines(keepends=True)
+    offsets = []
+    position = start
+    for line in lines:
+        offsets.append(position)
+        position += len(line)
+    df = pd.read_csv(io.BytesIO(header + chunk), parse_dates=['Timestamp'])
+    return df, offsets
+
+
+def update(raw_path, out_dir, check=False):
+    """Fold new raw readings into the per-month summary files in `out_dir`.
+
+    With `check`, only the rows read this run are validated, and
+    validate.ValidationFailed is raised before anything is written.
+    Returns the list of files written.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    state_path = out_dir / STATE
+    state = json.loads(state_path.read_text()) if state_path.exists() else {'offset': 0, 'hourly': {}}
+
+    df, offsets = _read_new_rows(raw_path, state['offset'])
+    if df.empty:
+        return []
+    if check:
+        import validate
+        report = validate.validate_frame(df)
+        if not report.ok:
+            raise validate.ValidationFailed(report)
+
+    dates = df['Timestamp'].dt.normalize()
+    # The read starts at the saved open day, so an earlier date is a re-sent old row
+    behind = (dates < dates.cummax()).to_numpy()
+    if behind.any():
+        row = int(behind.argmax())
+        raise ValueError(
+            f'{raw_path}: row at byte {offsets[row]} ({df["Timestamp"].iloc[row]}) is older than '
+            f'rows before it; summaries need date-ordered input, rebuild from scratch to include it'
+        )
+    open_day = dates.iloc[-1]
+    is_open = (dates == open_day).to_numpy()
+    closed, current = df[~is_open], df[is_open]
+
+    # Completed days are folded into the running per-hour sums for good
+    for label, rows in closed.groupby(closed['Timestamp'].map(period_label)):
+        sums, counts = _hourly_sums(rows)
+        acc = state['hourly'].setdefault(label, {'sums': [[0.0] * len(POWER_COLS)] * 24, 'counts': [0] * 24})
+        acc['sums'] = (pd.DataFrame(acc['sums'], columns=POWER_COLS) + sums.to_numpy()).values.tolist()
+        acc['counts'] = [a + int(b) for a, b in zip(acc['counts'], counts)]
+
+    written = []
+    for label, rows in df.groupby(df['Timestamp'].map(period_label)):
+        daily_path = out_dir / f'{label}_daily_summary.csv'
+        fresh = daily_summary(rows)
+        if daily_path.exists():
+            # The previously open day is recomputed from its first row, so replace it
+            existing = pd.read_csv(daily_path, dtype={'Date': str})
+            kept = existing[~existing['Date'].isin(fresh['Date'])]
+            fresh = pd.concat([kept, fresh]).sort_values('Date', kind='stable')
+        fresh.to_csv(daily_path, index=False)
+        written.append(daily_path)
+
+        acc = state['hourly'].get(label, {'sums': [[0.0] * len(POWER_COLS)] * 24, 'counts': [0] * 24})
+        sums = pd.DataFrame(acc['sums'], columns=POWER_COLS)
+        counts = pd.Series(acc['counts'])
+        open_rows = current[current['Timestamp'].map(period_label) == label]
+        if not open_rows.empty:
+            open_sums, open_counts = _hourly_sums(open_rows)
+            sums = sums + open_sums.to_numpy()
+            counts = counts + open_counts.to_numpy()
+        hourly = sums.div(counts.where(counts > 0), axis=0).round(2)
+        hourly.insert(0, 'Hour', range(24))
+        hourly_path = out_dir / f'{label}_hourly_patterns.csv'
+        hourly[counts.to_numpy() > 0].to_csv(hourly_path, index=False)
+        written.append(hourly_path)
+
+    state['offset'] = offsets[int(is_open.argmax())]
+    state_path.write_text(json.dumps(state))
+    return written
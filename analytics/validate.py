@@ -0,0 +1,178 @@
+"""Streaming data-quality checks for raw reading datasets.
+
+Every rule is a vectorised expression over a chunk of columns, so memory
+stays bounded by the chunk size and a year of fleet data validates in
+seconds. The one rule that spans rows (timestamp order and gaps) carries the
+last timestamp of each chunk into the next.
+
+Rules, per device D in the dataset (AC_Unit, Fan, Heater, ...):
+
+    missing_values       required column is empty
+    negative_power       D_Power_W or Total_Power_W < 0
+    total_power_sum      Total_Power_W != sum of D_Power_W
+    energy_matches_power D_Energy_kWh != D_Power_W / 1000 (hourly readings)
+    status_matches_power D_Status == ON  <=>  D_Power_W > 0
+    timestamp_order      Timestamp not strictly increasing
+    timestamp_gap        more than one hour since the previous reading
+
+The timestamp rules run per meter when the data has a meter column (one of
+METER_COLUMNS), so fleet files interleaving households are not flagged at
+every boundary; the last timestamp of each meter carries across chunks.
+
+The report keeps a count per rule plus the first few offending row indexes
+(0-based data rows, header excluded).
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+POWER_TOLERANCE_W = 0.02
+ENERGY_TOLERANCE_KWH = 1e-5
+SAMPLES = 10
+HOUR = np.timedelta64(1, 'h')
+METER_COLUMNS = ('Meter_ID', 'Customer_ID', 'Household_ID', 'meter_id', 'customer_id')
+
+
+class Report:
+    def __init__(self):
+        self.rows = 0
+        self.rules = {}
+
+    def add(self, rule, mask, offset):
+        """Record rows of the current chunk where `mask` is true."""
+        hits = np.flatnonzero(np.asarray(mask))
+        entry = self.rules.setdefault(rule, {'violations': 0, 'samples': []})
+        entry['violations'] += len(hits)
+        room = SAMPLES - len(entry['samples'])
+        if room > 0 and len(hits):
+            entry['samples'].extend(int(offset + i) for i in hits[:room])
+
+    @property
+    def violations(self):
+        return sum(r['violations'] for r in self.rules.values())
+
+    @property
+    def ok(self):
+        return self.violations == 0
+
+    def to_dict(self):
+        return {'rows': self.rows, 'violations': self.violations, 'rules': self.rules}
+
+    def __str__(self):
+        lines = [f'{self.rows} rows, {self.violations} violation(s)']
+        for rule, entry in sorted(self.rules.items()):
+            lines.append(f"  {rule:<24} {entry['violations']:>8}  rows {entry['samples']}")
+        return '\n'.join(lines)
+
+
+class ValidationFailed(Exception):
+    def __init__(self, report):
+        super().__init__(str(report))
+        self.report = report
+
+
+def devices_in(columns):
+    return [c[:-len('_Power_W')] for c in columns if c.endswith('_Power_W') and c != 'Total_Power_W']
+
+
+def meter_column(columns):
+    return next((c for c in METER_COLUMNS if c in columns), None)
+
+
+def _timestamp_steps(ts, meters, previous):
+    """Step from each row to the previous row of the same meter, in file order.
+
+    Rows are grouped with a stable sort, so within a meter they keep file
+    order; the first row of each meter steps from `previous` (last timestamp
+    per meter so far), which is updated in place.
+    """
+    order = np.argsort(meters, kind='stable')
+    m, t = meters[order], ts[order]
+    boundary = np.ones(len(t), dtype=bool)
+    boundary[1:] = m[1:] != m[:-1]
+    prev = np.concatenate((t[:1], t[:-1]))
+    has_prev = ~boundary
+    firsts = np.flatnonzero(boundary)
+    for i, key in zip(firsts, m[firsts].tolist()):
+        if key in previous:
+            prev[i] = previous[key]
+            has_prev[i] = True
+    lasts = np.append(firsts[1:] - 1, len(t) - 1) if len(t) else firsts
+    for i, key in zip(lasts, m[lasts].tolist()):
+        previous[key] = t[i]
+    step = np.empty_like(t - prev)
+    valid = np.empty(len(t), dtype=bool)
+    step[order] = t - prev
+    valid[order] = has_prev
+    return step, valid
+
+
+def check_chunk(report, chunk, offset, devices, previous):
+    """Apply every rule to one chunk; `previous` maps meter -> last timestamp and is updated."""
+    power = {d: chunk[f'{d}_Power_W'].to_numpy(dtype=float) for d in devices}
+    total = chunk['Total_Power_W'].to_numpy(dtype=float)
+
+    report.add('missing_values', chunk.isna().any(axis=1), offset)
+
+    negative = total < 0
+    for values in power.values():
+        negative |= values < 0
+    report.add('negative_power', negative, offset)
+
+    report.add('total_power_sum', np.abs(total - sum(power.values())) > POWER_TOLERANCE_W, offset)
+
+    energy_bad = np.zeros(len(chunk), dtype=bool)
+    for d, values in list(power.items()) + [('Total', total)]:
+        column = f'{d}_Energy_kWh'
+        if column in chunk:
+            energy_bad |= np.abs(chunk[column].to_numpy(dtype=float) - values / 1000) > ENERGY_TOLERANCE_KWH
+    report.add('energy_matches_power', energy_bad, offset)
+
+    status_bad = np.zeros(len(chunk), dtype=bool)
+    for d, values in power.items():
+        column = f'{d}_Status'
+        if column in chunk:
+            status_bad |= (chunk[column].to_numpy() == 'ON') != (values > 0)
+    report.add('status_matches_power', status_bad, offset)
+
+    ts = pd.to_datetime(chunk['Timestamp']).to_numpy()
+    column = meter_column(chunk.columns)
+    meters = chunk[column].astype(str).to_numpy() if column else np.zeros(len(ts), dtype=np.int8)
+    step, has_prev = _timestamp_steps(ts, meters, previous)
+    report.add('timestamp_order', has_prev & (step <= np.timedelta64(0, 's')), offset)
+    report.add('timestamp_gap', has_prev & (step > HOUR), offset)
+
+
+def _chunks(path, chunksize):
+    path = Path(path)
+    if path.suffix in ('.parquet', '.pq'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError('Validating Parquet input requires pyarrow')
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+
+def validate(path, chunksize=250_000):
+    """Stream `path` (CSV or Parquet) through every rule and return a Report."""
+    report = Report()
+    previous = {}
+    devices = None
+    for chunk in _chunks(path, chunksize):
+        if devices is None:
+            devices = devices_in(chunk.columns)
+        check_chunk(report, chunk, report.rows, devices, previous)
+        report.rows += len(chunk)
+    return report
+
+
+def validate_frame(df):
+    """Check rows already in memory (e.g. only the newly appended ones) and return a Report."""
+    report = Report()
+    check_chunk(report, df, 0, devices_in(df.columns), {})
+    report.rows = len(df)
+    return report
@@ -0,0 +1,129 @@
+# Conditional GET and compressed, cached bodies for analytics responses
+"""
+Validators come from watermarks.stamps(): the persisted
+customer_watermarks.updated_at of each customer a response covers (the
+newest one on any shard for fleet-wide queries). Ingest, the scoring worker
+and app.rebalance set it in the transaction that changes the data. The ETag
+hashes those stamps with the request path and query and nothing
+process-specific, so every API process behind a balancer produces the same
+validator and a client sending it back in If-None-Match gets a 304 from any
+of them. Stamps are cached for VALIDATOR_REFRESH_SECONDS, so a 304 usually
+costs no database query at all, and another process's write shows up
+within that time.
+
+Bodies above COMPRESS_MIN_BYTES are compressed with brotli when the client
+accepts it and the optional `brotli` package is installed, and with gzip
+otherwise. Encoded bodies are kept in an LRU keyed by (ETag, encoding), so
+refreshing dashboards for hot customers are served from memory. An ETag
+names exactly one body, so entries never go stale and are evicted by size
+only.
+"""
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Awaitable, Callable, Iterable
+from fastapi import Request, Response
+from pydantic import BaseModel
+from .cache import TTLCache
+from .db import ShardSet
+from .metrics import counters
+from .watermarks import watermarks
+import calendar
+import gzip
+import hashlib
+import math
+import os
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+# Bump when a response model changes shape, so old ETags stop matching
+RESPONSE_FORMAT = 1
+
+responses = TTLCache(maxsize=int(os.getenv("RESPONSE_CACHE_SIZE", "2000")), ttl=math.inf)
+
+
+async def validator(request: Request, shards: ShardSet, customer_ids: Iterable[int | None]) -> tuple[str, float]:
+    """Weak ETag and Last-Modified time for a response covering `customer_ids`."""
+    stamps = await watermarks.stamps(shards, customer_ids)
+    covered = sorted((c is None, c or 0, stamp.isoformat()) for c, stamp in stamps.items())
+    # Stamps are naive UTC
+    modified = calendar.timegm(max(stamps.values()).timetuple())
+    digest = hashlib.blake2b(digest_size=12)
+    digest.update(repr((
+        RESPONSE_FORMAT, request.url.path, sorted(request.query_params.multi_items()), covered,
+    )).encode())
+    return f'W/"{digest.hexdigest()}"', modified
+
+
+def not_modified(request: Request, etag: str, modified: float) -> bool:
+    # If-None-Match wins over If-Modified-Since (RFC 9110 13.2.2)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {t.strip() for t in if_none_match.split(",")}
+        # Weak comparison: W/"x" and "x" match
+        return "*" in tags or etag in tags or etag[2:] in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def negotiate(accept_encoding: str) -> str:
+    accepted = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip().lower())
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return "identity"
+
+
+def encode(body: bytes, encoding: str) -> tuple[bytes, str]:
+    if len(body) < COMPRESS_MIN_BYTES or encoding == "identity":
+        return body, "identity"
+    if encoding == "br":
+        return brotli.compress(body, quality=5), "br"
+    return gzip.compress(body, compresslevel=6), "gzip"
+
+
+async def conditional(
+    request: Request,
+    shards: ShardSet,
+    customer_ids: Iterable[int | None],
+    model: type[BaseModel],
+    build: Callable[[], Awaitable[dict]],
+) -> Response:
+    """Answer a GET with 304, a cached encoded body, or `build()` serialised through `model`."""
+    etag, modified = await validator(request, shards, customer_ids)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(modified, usegmt=True),
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if not_modified(request, etag, modified):
+        counters["conditional_not_modified"] += 1
+        return Response(status_code=304, headers=headers)
+
+    encoding = negotiate(request.headers.get("accept-encoding", ""))
+    cached = responses.get((etag, encoding))
+    if cached is None:
+        counters["conditional_cache_misses"] += 1
+        body = model.model_validate(await build()).model_dump_json().encode()
+        cached = encode(body, encoding)
+        responses.set((etag, encoding), cached)
+    else:
+        counters["conditional_cache_hits"] += 1
+    body, applied = cached
+    if applied != "identity":
+        headers["Content-Encoding"] = applied
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,99 @@
+# Peak demand and load-duration curves from the 15-minute usage rollups
+from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+
+BUCKET_MINUTES = 15
+WINDOWS = (15, 30, 60)  # minutes; multiples of the rollup bucket
+
+
+def period_bounds(period: str) -> tuple[datetime, datetime]:
+    start = datetime.strptime(period, "%Y-%m")
+    end = datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start, end
+
+
+async def reading_interval(session: AsyncSession, customer_id: int, start: datetime, end: datetime) -> int:
+    """Typical minutes between the customer's readings in the period, at least one rollup bucket.
+
+    A reading's whole kWh lands in the bucket its timestamp falls in, so with
+    hourly readings a 15-minute window would see an hour's energy and
+    overstate demand 4x. Windows shorter than this are not reported.
+    """
+    res = await session.execute(
+        text("""
+          SELECT percentile_disc(0.5) WITHIN GROUP (ORDER BY gap) FROM (
+            SELECT EXTRACT(EPOCH FROM bucket - LAG(bucket) OVER (ORDER BY bucket)) / 60 AS gap
+            FROM usage_rollups
+            WHERE customer_id = :cid AND bucket >= :start AND bucket < :end
+          ) gaps
+          WHERE gap IS NOT NULL
+        """),
+        {"cid": customer_id, "start": start, "end": end},
+    )
+    gap = res.scalar()
+    if not gap:
+        return BUCKET_MINUTES
+    return max(BUCKET_MINUTES, round(float(gap) / BUCKET_MINUTES) * BUCKET_MINUTES)
+
+
+def windows_for(interval: int) -> list[int]:
+    # Windows shorter than the reading interval become one interval-long window
+    return sorted({max(m, interval) for m in WINDOWS})
+
+
+async def peaks(session: AsyncSession, customer_id: int, start: datetime, end: datetime,
+                interval: int = BUCKET_MINUTES) -> list[dict]:
+    """Maximum average kW over each sliding window, and when that window started."""
+    windows = windows_for(interval)
+    sums = ",\n".join(
+        f"SUM(kwh) OVER (ORDER BY bucket RANGE BETWEEN INTERVAL '{m - BUCKET_MINUTES} minutes' PRECEDING "
+        f"AND CURRENT ROW) AS e{m}"
+        for m in windows
+    )
+    maxima = "\nUNION ALL\n".join(
+        f"(SELECT {m} AS minutes, e{m} * 60.0 / {m} AS kw, bucket - INTERVAL '{m - BUCKET_MINUTES} minutes' AS start "
+        f"FROM windows ORDER BY e{m} DESC, bucket LIMIT 1)"
+        for m in windows
+    )
+    res = await session.execute(
+        text(f"""
+          WITH windows AS (
+            SELECT bucket,
+            {sums}
+            FROM usage_rollups
+            WHERE customer_id = :cid AND bucket >= :start AND bucket < :end
+          )
+          {maxima}
+        """),
+        {"cid": customer_id, "start": start, "end": end},
+    )
+    return [
+        {"window_minutes": minutes, "kw": round(kw, 4), "start": peak_start.isoformat()}
+        for minutes, kw, peak_start in res.all()
+    ]
+
+
+async def load_duration(session: AsyncSession, customer_id: int, start: datetime, end: datetime,
+                        points: int, interval: int = BUCKET_MINUTES) -> list[dict]:
+    """Demand exceeded for each fraction of the metered intervals (reading-interval long)."""
+    fractions = [i / (points - 1) for i in range(points)]
+    res = await session.execute(
+        text("""
+          SELECT percentile_disc(CAST(:fractions AS double precision[]))
+                 WITHIN GROUP (ORDER BY kwh * 60.0 / CAST(:minutes AS double precision) DESC)
+          FROM (
+            SELECT date_bin(CAST(:width AS interval), bucket, TIMESTAMP '2000-01-01') AS slot, SUM(kwh) AS kwh
+            FROM usage_rollups
+            WHERE customer_id = :cid AND bucket >= :start AND bucket < :end
+            GROUP BY 1
+          ) slots
+        """),
+        {"cid": customer_id, "start": start, "end": end, "fractions": fractions,
+         "minutes": interval, "width": timedelta(minutes=interval)},
+    )
+    values = res.scalar() or []
+    return [
+        {"percent_of_time": round(f * 100, 2), "kw": round(kw, 4)}
+        for f, kw in zip(fractions, values)
+    ]
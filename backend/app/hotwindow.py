@@ -0,0 +1,347 @@
+# In-memory hot tier of each active customer's recent readings
+"""
+Each customer gets a fixed-capacity ring of NumPy arrays: epoch seconds
+(int64), kWh (float64), voltage and current (float32, NaN when absent).
+That is 24 bytes per reading, so the defaults (1,024 readings, 10,000
+customers) bound the tier at about 250 MB. Customers are evicted
+least-recently-used first.
+
+A ring holds readings in arrival order and is queried with boolean masks,
+so late readings need no reordering. Its `covered_from` is the earliest
+epoch second from which it holds *every* stored reading. Overwriting a slot
+raises it past the overwritten timestamp. A query starting before it
+backfills the missing range from the database and merges it in. Backfilled
+timestamps already present are skipped, because (customer_id, ts) is
+unique.
+
+Ingest pushes only rows it actually inserted, right after commit and
+without awaiting in between. So a ring either already has a reading when a
+backfill query runs, or the backfill's snapshot includes it. Never both
+without the ts check above, never neither.
+
+A window the ring cannot cover (more readings than its capacity) is
+answered by `from_database` instead. Like the watermarks, the tier lives in
+one process and only sees readings ingested through it. So each ring records
+the database time of its last sync (`sync_mark`), and a query more than
+HOT_WINDOW_SYNC_SECONDS (default 60) later first reads the rows
+ingested since then (meter_readings.ingested_at) within the ring's covered
+span. That picks up readings other processes or app.rebalance wrote, late
+ones included, with an index range scan over the span that returns only the
+new rows. ingested_at is its transaction's start time, so the read overlaps
+the mark by SYNC_OVERLAP to catch transactions that were still open; rows
+already held are skipped. Pushes do not count as a sync. A single API
+process can set it to inf. Set HOT_WINDOW_MAX_CUSTOMERS=0 to answer every
+query from the database.
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+from .db import ShardSet
+from .metrics import counters, gauge
+import numpy as np
+import os
+import time
+
+CAPACITY = int(os.getenv("HOT_WINDOW_CAPACITY", "1024"))
+MAX_CUSTOMERS = int(os.getenv("HOT_WINDOW_MAX_CUSTOMERS", "10000"))
+SPAN_SECONDS = int(float(os.getenv("HOT_WINDOW_DAYS", "7")) * 86400)
+SYNC_SECONDS = float(os.getenv("HOT_WINDOW_SYNC_SECONDS", "60"))
+SYNC_OVERLAP = timedelta(minutes=5)  # longest ingest transaction a sync is sure to see
+WARM_BATCH = 500
+UNKNOWN = np.iinfo(np.int64).max
+
+
+def epoch_seconds(ts) -> np.ndarray:
+    # meter_readings.ts is naive UTC
+    return np.asarray(ts, dtype="datetime64[s]").astype(np.int64)
+
+
+def _floats(values, dtype) -> np.ndarray:
+    return np.array([np.nan if v is None else v for v in values], dtype=dtype)
+
+
+class Ring:
+    """Fixed-capacity ring of one customer's readings."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.ts = np.zeros(capacity, dtype=np.int64)
+        self.kwh = np.zeros(capacity, dtype=np.float64)
+        self.voltage = np.full(capacity, np.nan, dtype=np.float32)
+        self.current = np.full(capacity, np.nan, dtype=np.float32)
+        self.n = 0
+        self.head = 0
+        # Nothing is known to be complete until a backfill runs
+        self.covered_from = UNKNOWN
+        # time.monotonic() and database LOCALTIMESTAMP when the last sync started
+        self.synced_at = -np.inf
+        self.sync_mark: datetime | None = None
+
+    @property
+    def nbytes(self) -> int:
+        return self.ts.nbytes + self.kwh.nbytes + self.voltage.nbytes + self.current.nbytes
+
+    def push(self, ts: np.ndarray, kwh: np.ndarray, voltage: np.ndarray, current: np.ndarray) -> None:
+        if not len(ts):
+            return
+        # A ring created by ingest stays UNKNOWN: older stored readings may exist
+        cap = self.capacity
+        if len(ts) > cap:
+            self.covered_from = max(self.covered_from, int(ts[:-cap].max()) + 1)
+            ts, kwh, voltage, current = ts[-cap:], kwh[-cap:], voltage[-cap:], current[-cap:]
+        positions = (self.head + np.arange(len(ts))) % cap
+        # Until the ring first fills, slots [0, n) are the occupied ones
+        overwritten = positions[positions < self.n]
+        if len(overwritten):
+            self.covered_from = max(self.covered_from, int(self.ts[overwritten].max()) + 1)
+        self.ts[positions] = ts
+        self.kwh[positions] = kwh
+        self.voltage[positions] = voltage
+        self.current[positions] = current
+        self.head = (self.head + len(ts)) % cap
+        self.n = min(cap, self.n + len(ts))
+
+    def merge(self, since: int, until: int | None, ts: np.ndarray, kwh: np.ndarray,
+              voltage: np.ndarray, current: np.ndarray, truncated: bool) -> None:
+        """Fold in database rows from [since, until), keeping the newest `capacity` readings."""
+        have = self.ts[:self.n]
+        new = ~np.isin(ts, have)
+        all_ts = np.concatenate((have, ts[new]))
+        order = np.argsort(all_ts, kind="stable")[-self.capacity:]
+        covered = self.covered_from
+        # The rows extend coverage only if the ring still reaches down to `until`; it may
+        # have been recreated or overwritten while they were loading
+        if until is None or self.covered_from <= until:
+            covered = min(covered, int(ts.min()) if truncated and len(ts) else since)
+        if len(order) < len(all_ts):
+            covered = max(covered, int(all_ts[order[0]]))
+        self.ts[:len(order)] = all_ts[order]
+        self.kwh[:len(order)] = np.concatenate((self.kwh[:self.n], kwh[new]))[order]
+        self.voltage[:len(order)] = np.concatenate((self.voltage[:self.n], voltage[new]))[order]
+        self.current[:len(order)] = np.concatenate((self.current[:self.n], current[new]))[order]
+        self.n = len(order)
+        self.head = self.n % self.capacity
+        self.covered_from = covered
+
+    def synced(self, began: float, mark: datetime) -> None:
+        self.synced_at = max(self.synced_at, began)
+        self.sync_mark = mark if self.sync_mark is None else max(self.sync_mark, mark)
+
+    def buckets(self, start: int, width: int, count: int) -> dict[str, np.ndarray]:
+        """Per-bucket sums for `count` buckets of `width` seconds from `start`."""
+        ts = self.ts[:self.n]
+        mask = (ts >= start) & (ts < start + width * count)
+        idx = (ts[mask] - start) // width
+        out = {
+            "kwh": np.bincount(idx, weights=self.kwh[:self.n][mask], minlength=count),
+            "readings": np.bincount(idx, minlength=count),
+        }
+        for name in ("voltage", "current"):
+            values = getattr(self, name)[:self.n][mask]
+            present = ~np.isnan(values)
+            total = np.bincount(idx[present], weights=values[present], minlength=count)
+            seen = np.bincount(idx[present], minlength=count)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                out[name] = np.where(seen > 0, total / np.maximum(seen, 1), np.nan)
+        return out
+
+
+class HotWindow:
+    def __init__(self, capacity: int = CAPACITY, max_customers: int = MAX_CUSTOMERS,
+                 span_seconds: int = SPAN_SECONDS, sync_seconds: float = SYNC_SECONDS):
+        self.capacity = capacity
+        self.max_customers = max_customers
+        self.span_seconds = span_seconds
+        self.sync_seconds = sync_seconds
+        self._rings: OrderedDict[int, Ring] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._rings)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(r.nbytes for r in self._rings.values())
+
+    def _ring(self, customer_id: int, create: bool) -> Ring | None:
+        ring = self._rings.get(customer_id)
+        if ring is not None:
+            self._rings.move_to_end(customer_id)
+        elif create and self.max_customers > 0:
+            ring = self._rings[customer_id] = Ring(self.capacity)
+            if len(self._rings) > self.max_customers:
+                self._rings.popitem(last=False)
+        return ring
+
+    def push(self, customer_ids, ts, kwh, voltage, current) -> None:
+        """Add committed readings (all parallel sequences)."""
+        if self.max_customers <= 0 or not len(customer_ids):
+            return
+        cids = np.asarray(customer_ids, dtype=np.int64)
+        seconds = epoch_seconds(ts)
+        kwh = np.asarray(kwh, dtype=np.float64)
+        voltage, current = _floats(voltage, np.float32), _floats(current, np.float32)
+        order = np.argsort(cids, kind="stable")
+        unique, starts = np.unique(cids[order], return_index=True)
+        for customer_id, part in zip(unique.tolist(), np.split(order, starts[1:])):
+            self._ring(customer_id, create=True).push(seconds[part], kwh[part], voltage[part], current[part])
+
+    async def _load(self, session: AsyncSession, customer_ids: list[int], since: int,
+                    until: dict[int, int]) -> dict[int, tuple]:
+        res = await session.execute(
+            text("""
+              SELECT customer_id, ts, kwh, voltage, current FROM (
+                SELECT r.customer_id, r.ts, r.kwh, r.voltage, r.current,
+                       row_number() OVER (PARTITION BY r.customer_id ORDER BY r.ts DESC) AS rn
+                FROM meter_readings r
+                JOIN unnest(CAST(:ids AS integer[]), CAST(:until AS timestamp[])) AS u(customer_id, until)
+                  ON u.customer_id = r.customer_id
+                WHERE r.ts >= :since AND (u.until IS NULL OR r.ts < u.until)
+              ) recent
+              WHERE rn <= :cap
+            """),
+            {
+                "ids": customer_ids,
+                "until": [None if until.get(c) is None else _as_datetime(until[c]) for c in customer_ids],
+                "since": _as_datetime(since),
+                "cap": self.capacity,
+            },
+        )
+        rows: dict[int, list] = {c: [] for c in customer_ids}
+        for customer_id, *reading in res.all():
+            rows[customer_id].append(reading)
+        return {
+            customer_id: (*_arrays(readings), len(readings) >= self.capacity)
+            for customer_id, readings in rows.items()
+        }
+
+    async def _resync(self, shards: ShardSet, customer_id: int, ring: Ring) -> None:
+        """Merge rows other processes ingested since the ring's last sync, within its covered span."""
+        counters["hot_window_resyncs"] += 1
+        began = time.monotonic()
+        async with shards.session_for(customer_id) as session:
+            mark = await _database_time(session)
+            res = await session.execute(
+                text("""
+                  SELECT ts, kwh, voltage, current FROM meter_readings
+                  WHERE customer_id = :cid AND ts >= :since AND ingested_at > :after
+                """),
+                {"cid": customer_id, "since": _as_datetime(ring.covered_from),
+                 "after": ring.sync_mark - SYNC_OVERLAP},
+            )
+            readings = res.all()
+        if readings:
+            # Coverage is unchanged, unless the ring overflows and drops its oldest readings
+            ring.merge(ring.covered_from, None, *_arrays(readings), False)
+        ring.synced(began, mark)
+
+    async def ensure(self, shards: ShardSet, customer_id: int, start: int) -> Ring | None:
+        """A ring holding every reading from `start` on, backfilled if needed; None if it cannot."""
+        ring = self._ring(customer_id, create=False)
+        if (ring is not None and start >= ring.covered_from and ring.sync_mark is not None
+                and time.monotonic() - ring.synced_at > self.sync_seconds):
+            await self._resync(shards, customer_id, ring)
+        if ring is not None and start >= ring.covered_from:
+            counters["hot_window_hits"] += 1
+            return ring
+        if self.max_customers <= 0:
+            return None
+        counters["hot_window_loads"] += 1
+        began = time.monotonic()
+        since = min(start, int(time.time()) - self.span_seconds)
+        until = ring.covered_from if ring is not None and ring.covered_from != UNKNOWN else None
+        async with shards.session_for(customer_id) as session:
+            mark = await _database_time(session)
+            loaded = (await self._load(session, [customer_id], since, {customer_id: until}))[customer_id]
+        # Re-fetch: ingest may have created or filled the ring while the query ran
+        ring = self._ring(customer_id, create=True)
+        ring.merge(since, until, *loaded)
+        if until is None:
+            # Loaded up to now; a partial backfill of older rows leaves the sync point alone
+            ring.synced(began, mark)
+        if start >= ring.covered_from:
+            return ring
+        # More readings in the window than the ring holds, or a concurrent change
+        counters["hot_window_misses"] += 1
+        return None
+
+    async def warm(self, shards: ShardSet) -> int:
+        """Load the most recently active customers on every shard, up to max_customers in total."""
+        if self.max_customers <= 0:
+            return 0
+        since = int(time.time()) - self.span_seconds
+        warmed = 0
+        per_shard = -(-self.max_customers // len(shards))
+        for index in range(len(shards)):
+            async with shards.sessionmakers[index]() as session:
+                res = await session.execute(
+                    text("""
+                      SELECT customer_id FROM customer_watermarks
+                      WHERE max_ts >= :since ORDER BY max_ts DESC LIMIT :n
+                    """),
+                    {"since": _as_datetime(since), "n": per_shard},
+                )
+                customer_ids = [r[0] for r in res.all()]
+                # Least active first so the most active end up most recently used
+                customer_ids.reverse()
+                for i in range(0, len(customer_ids), WARM_BATCH):
+                    began = time.monotonic()
+                    mark = await _database_time(session)
+                    loaded = await self._load(session, customer_ids[i:i + WARM_BATCH], since, {})
+                    for customer_id, data in loaded.items():
+                        # Merging also completes rings that ingest created while this ran
+                        ring = self._ring(customer_id, create=True)
+                        ring.merge(since, None, *data)
+                        ring.synced(began, mark)
+                    warmed += len(loaded)
+        counters["hot_window_warmed"] += warmed
+        return warmed
+
+
+async def from_database(session: AsyncSession, customer_id: int, start: int, width: int,
+                        count: int) -> dict[str, np.ndarray]:
+    """Same result as Ring.buckets, computed by Postgres (for windows the ring cannot cover)."""
+    res = await session.execute(
+        text("""
+          SELECT FLOOR((EXTRACT(EPOCH FROM ts) - :start) / :width)::int AS b,
+                 SUM(kwh), COUNT(*), AVG(voltage), AVG(current)
+          FROM meter_readings
+          WHERE customer_id = :cid AND ts >= :start_ts AND ts < :end_ts
+          GROUP BY 1
+        """),
+        {"cid": customer_id, "start": start, "width": width,
+         "start_ts": _as_datetime(start), "end_ts": _as_datetime(start + width * count)},
+    )
+    out = {
+        "kwh": np.zeros(count),
+        "readings": np.zeros(count, dtype=np.int64),
+        "voltage": np.full(count, np.nan),
+        "current": np.full(count, np.nan),
+    }
+    for b, kwh, n, voltage, current in res.all():
+        out["kwh"][b] = kwh
+        out["readings"][b] = n
+        out["voltage"][b] = np.nan if voltage is None else voltage
+        out["current"][b] = np.nan if current is None else current
+    return out
+
+
+def _arrays(readings: list) -> tuple[np.ndarray, ...]:
+    # (ts, kwh, voltage, current) rows to ring columns
+    ts, kwh, voltage, current = zip(*readings) if readings else ((), (), (), ())
+    return (epoch_seconds(list(ts)), np.asarray(kwh, dtype=np.float64),
+            _floats(voltage, np.float32), _floats(current, np.float32))
+
+
+async def _database_time(session: AsyncSession) -> datetime:
+    # Same clock as meter_readings.ingested_at (its transaction's LOCALTIMESTAMP)
+    return (await session.execute(text("SELECT LOCALTIMESTAMP"))).scalar()
+
+
+def _as_datetime(seconds: int) -> datetime:
+    return datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None)
+
+
+hot = HotWindow()
+gauge("hot_window_customers", lambda: len(hot))
+gauge("hot_window_bytes", lambda: hot.nbytes)
@@ -1,9 +1,43 @@
 # FastAPI backend for Smart Electricity Meter
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .routers import ingest, analytics, billing
+from .scoring import workers as scoring_workers
+from .hotwindow import hot
+from .db import shards
+from . import metrics
+import asyncio
+import logging
+import os
 
-app = FastAPI(title="Smart Electricity Meter API", version="0.1.0")
+SCORING_ENABLED = os.getenv("SCORING_ENABLED", "1") != "0"
+HOT_WINDOW_WARM = os.getenv("HOT_WINDOW_WARM", "1") != "0"
+
+log = logging.getLogger(__name__)
+
+async def warm_hot_window():
+    # Runs in the background: the API serves (from the database) while the tier fills
+    try:
+        warmed = await hot.warm(shards)
+        log.info("Hot window warmed with %d customers", warmed)
+    except Exception:
+        log.exception("Hot window warm-up failed; customers will load on first query")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if SCORING_ENABLED:
+        for worker in scoring_workers:
+            worker.start()
+    warming = asyncio.create_task(warm_hot_window()) if HOT_WINDOW_WARM else None
+    yield
+    if warming is not None:
+        warming.cancel()
+        await asyncio.gather(warming, return_exceptions=True)
+    for worker in scoring_workers:
+        await worker.stop()
+
+app = FastAPI(title="Smart Electricity Meter API", version="0.1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,3 +54,7 @@ app.include_router(billing.router, prefix="/api")
 @app.get("/health")
 def health():
     return {"status": "ok"}
+
+@app.get("/metrics")
+def metrics_snapshot():
+    return metrics.snapshot()
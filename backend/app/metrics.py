@@ -0,0 +1,15 @@
+# In-process counters and gauges served at /metrics
+from collections import Counter
+from typing import Callable
+
+counters: Counter[str] = Counter()
+_gauges: dict[str, Callable[[], float]] = {}
+
+def gauge(name: str, fn: Callable[[], float]) -> None:
+    _gauges[name] = fn
+
+def snapshot() -> dict[str, float]:
+    out: dict[str, float] = dict(counters)
+    for name, fn in _gauges.items():
+        out[name] = fn()
+    return out
@@ -8,3 +8,9 @@ def detect_anomaly(kwh: float) -> tuple[bool, str | None]:
     if kwh > 5.0:
         return True, "High usage spike"
     return False, None
+
+def score_batch(kwh: list[float]) -> tuple[list[float], list[bool], list[str | None]]:
+    # Column-wise scoring of a batch; runs in the scoring worker pool
+    costs = [estimate_cost(k) for k in kwh]
+    flags = [detect_anomaly(k) for k in kwh]
+    return costs, [a for a, _ in flags], [n for _, n in flags]
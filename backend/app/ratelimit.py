@@ -0,0 +1,139 @@
+# Token-bucket admission control for ingest and analytics
+from collections import OrderedDict
+from fastapi import HTTPException, Request
+from typing import Hashable
+from .metrics import counters, gauge
+import math
+import os
+import time
+
+
+class TokenBucketLimiter:
+    """One token bucket per key, refilled at `rate` tokens/sec up to `burst`.
+
+    Each key costs one (tokens, last_refill) pair. Keys are kept in
+    least-recently-used order, and a key idle for longer than it takes to
+    refill completely is evicted: a fresh bucket would be identical, so
+    eviction never changes a decision.
+
+    A cost above `burst` (a backlog upload, say) is admitted once the bucket
+    is full, but debited in full: the bucket goes negative and the key waits
+    cost / rate before its next request, so large batches cannot exceed the
+    configured rate.
+    """
+
+    def __init__(self, rate: float, burst: float, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.idle = burst / rate
+        self.clock = clock
+        self._buckets: OrderedDict[Hashable, list[float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _evict_idle(self, now: float) -> None:
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if now - bucket[1] < self.idle:
+                break
+            bucket[0] += (now - bucket[1]) * self.rate
+            if bucket[0] >= self.burst:
+                del self._buckets[key]
+            else:
+                # Still paying off an oversized batch: refill so far and keep it
+                bucket[1] = now
+                self._buckets.move_to_end(key)
+
+    def _bucket(self, key: Hashable) -> list[float]:
+        now = self.clock()
+        self._evict_idle(now)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now]
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def check(self, key: Hashable, cost: float = 1.0) -> float:
+        """Seconds until `key` may spend `cost` tokens (0 if now); nothing is debited."""
+        bucket = self._bucket(key)
+        # An oversized cost only needs a full bucket; the rest is paid back as debt
+        needed = min(cost, self.burst)
+        return 0.0 if bucket[0] >= needed else (needed - bucket[0]) / self.rate
+
+    def debit(self, key: Hashable, cost: float = 1.0) -> None:
+        bucket = self._bucket(key)
+        bucket[0] -= cost
+
+    def take(self, key: Hashable, cost: float = 1.0) -> float:
+        """Admit `cost` tokens for `key`; return 0, or seconds to wait."""
+        wait = self.check(key, cost)
+        if not wait:
+            self.debit(key, cost)
+        return wait
+
+
+def _from_env(scope: str, default: str) -> TokenBucketLimiter | None:
+    # RATE_LIMIT_<SCOPE>="<tokens per second>/<burst>"; "off" disables the scope
+    spec = os.getenv(f"RATE_LIMIT_{scope.upper()}", default)
+    if spec.lower() in ("", "0", "off"):
+        return None
+    rate, _, burst = spec.partition("/")
+    return TokenBucketLimiter(float(rate), float(burst or rate))
+
+
+limiters = {
+    scope: limiter
+    for scope, limiter in {
+        "ingest_key": _from_env("ingest_key", "1000/50000"),
+        "ingest_customer": _from_env("ingest_customer", "1/600"),
+        "analytics": _from_env("analytics", "5/20"),
+    }.items()
+    if limiter is not None
+}
+
+for _scope, _limiter in limiters.items():
+    gauge(f"ratelimit_{_scope}_active_keys", _limiter.__len__)
+
+
+def enforce_all(charges: list[tuple[str, Hashable, float]]) -> None:
+    """Admit a request only if every (scope, key, cost) bucket has room, then debit them all.
+
+    Checking before debiting means a request refused by one bucket (a
+    noisy customer) takes nothing from the others (the shared API key).
+    """
+    charges = [(scope, key, cost) for scope, key, cost in charges if scope in limiters]
+    waits = [(limiters[scope].check(key, cost), scope) for scope, key, cost in charges]
+    wait, scope = max(waits, default=(0.0, None))
+    if wait:
+        # Retry-After covers the slowest bucket, so a retry then is admitted
+        counters[f"ratelimit_{scope}_rejected"] += 1
+        _reject(scope, limiters[scope], wait)
+    for scope, key, cost in charges:
+        limiters[scope].debit(key, cost)
+        counters[f"ratelimit_{scope}_allowed"] += 1
+
+
+def enforce(scope: str, key: Hashable, cost: float = 1.0) -> None:
+    enforce_all([(scope, key, cost)])
+
+
+def _reject(scope: str, limiter: TokenBucketLimiter, wait: float) -> None:
+    raise HTTPException(
+        status_code=429,
+        detail={"error": "rate_limited", "scope": scope, "retry_after": round(wait, 3),
+                "limit": {"rate": limiter.rate, "burst": limiter.burst}},
+        headers={"Retry-After": str(math.ceil(wait))},
+    )
+
+
+def limit_per_client(scope: str):
+    """Route dependency keyed by route and customer_id (or client address)."""
+    def dependency(request: Request) -> None:
+        tenant = request.query_params.get("customer_id") or (
+            request.client.host if request.client else "unknown")
+        enforce(scope, (request.url.path, tenant))
+    return dependency
@@ -0,0 +1,223 @@
+"""Move customers between shards after the shard list changes.
+
+Placement is rendezvous hashing on shard names (see db.ShardSet), so when a
+shard is added or removed only the customers whose owner changed need to
+move. Run from backend/ with SHARD_URLS set to the *new* layout:
+
+    python -m app.rebalance --from "a=postgresql+asyncpg://...,b=..." plan
+    python -m app.rebalance --from "..." copy      # before and again after deploying
+    python -m app.rebalance --from "..." cleanup   # once the API uses the new layout
+
+`copy` is idempotent (natural keys and ON CONFLICT), so running it again
+after the API switches picks up readings ingested during the move.
+Copied readings are queued for scoring again on the target because reading
+ids are per-database. `cleanup` deletes a moved customer from its old shard
+only when the target holds at least as many readings.
+"""
+import argparse
+import asyncio
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from .db import SHARD_URLS, ShardSet, parse_shards
+from . import sketches
+from .watermarks import CHANGED_NOW
+
+PAGE = 10_000
+
+
+async def customers_on(session: AsyncSession) -> list[int]:
+    res = await session.execute(text("""
+      SELECT customer_id FROM customer_watermarks
+      UNION SELECT customer_id FROM billing
+      UNION SELECT customer_id FROM payments
+    """))
+    return sorted(r[0] for r in res.all())
+
+
+async def plan(old: ShardSet, new: ShardSet) -> list[tuple[int, str, str]]:
+    """(customer_id, from shard name, to shard name) for every customer that moves."""
+    moves = []
+    for i, name in enumerate(old.names):
+        async with old.sessionmakers[i]() as session:
+            for customer_id in await customers_on(session):
+                owner = new.names[new.index_for(customer_id)]
+                if owner != name:
+                    moves.append((customer_id, name, owner))
+    return moves
+
+
+async def _copy_keyed(src: AsyncSession, dst: AsyncSession, customer_id: int,
+                      keys: tuple[str, ...], select: str, insert: str) -> int:
+    # Page through one customer's rows by their key columns and bulk insert each page
+    copied = 0
+    after = {f"after_{k}": None for k in keys}
+    while True:
+        res = await src.execute(text(select), {"cid": customer_id, "n": PAGE, **after})
+        rows = res.mappings().all()
+        if rows:
+            columns = {k: [r[k] for r in rows] for k in rows[0].keys()}
+            await dst.execute(text(insert), {"cid": customer_id, **columns})
+            copied += len(rows)
+        if len(rows) < PAGE:
+            return copied
+        after = {f"after_{k}": rows[-1][k] for k in keys}
+
+
+async def copy_customer(src: AsyncSession, dst: AsyncSession, customer_id: int) -> int:
+    res = await src.execute(text("SELECT id, email, name FROM customers WHERE id = :cid"), {"cid": customer_id})
+    customer = res.mappings().first()
+    if customer:
+        await dst.execute(text("""
+          INSERT INTO customers (id, email, name) VALUES (:id, :email, :name)
+          ON CONFLICT (id) DO NOTHING
+        """), dict(customer))
+
+    readings = await _copy_keyed(src, dst, customer_id, ("ts",), """
+      SELECT ts, kwh, voltage, current FROM meter_readings
+      WHERE customer_id = :cid AND (CAST(:after_ts AS timestamp) IS NULL OR ts > :after_ts)
+      ORDER BY ts LIMIT :n
+    """, """
+      WITH copied AS (
+        INSERT INTO meter_readings (customer_id, ts, kwh, voltage, current)
+        SELECT :cid, * FROM unnest(
+          CAST(:ts AS timestamp[]), CAST(:kwh AS double precision[]),
+          CAST(:voltage AS double precision[]), CAST(:current AS double precision[])
+        )
+        ON CONFLICT (customer_id, ts) DO NOTHING
+        RETURNING id, customer_id, kwh
+      )
+      INSERT INTO scoring_queue (reading_id, customer_id, kwh)
+      SELECT id, customer_id, kwh FROM copied
+    """)
+    await _copy_keyed(src, dst, customer_id, ("ts", "channel"), """
+      SELECT ts, channel, kwh FROM meter_channel_readings
+      WHERE customer_id = :cid
+        AND (CAST(:after_ts AS timestamp) IS NULL
+             OR (ts, channel) > (:after_ts, CAST(:after_channel AS varchar)))
+      ORDER BY ts, channel LIMIT :n
+    """, """
+      INSERT INTO meter_channel_readings (customer_id, ts, channel, kwh)
+      SELECT :cid, * FROM unnest(
+        CAST(:ts AS timestamp[]), CAST(:channel AS varchar[]), CAST(:kwh AS double precision[])
+      )
+      ON CONFLICT (customer_id, ts, channel) DO NOTHING
+    """)
+
+    # Rollups and sketches are derived; rebuild them from the target's readings
+    await dst.execute(text("DELETE FROM usage_rollups WHERE customer_id = :cid"), {"cid": customer_id})
+    await dst.execute(text("""
+      INSERT INTO usage_rollups (customer_id, bucket, kwh, readings)
+      SELECT customer_id, date_bin('15 minutes', ts, TIMESTAMP '2000-01-01'), SUM(kwh), COUNT(*)
+      FROM meter_readings WHERE customer_id = :cid
+      GROUP BY 1, 2
+    """), {"cid": customer_id})
+    await sketches.rebuild(dst, customer_id)
+    # A fresh updated_at changes the customer's analytics ETags on every process
+    await dst.execute(text(f"""
+      INSERT INTO customer_watermarks (customer_id, max_ts, updated_at)
+      SELECT customer_id, MAX(ts), {CHANGED_NOW} FROM meter_readings WHERE customer_id = :cid GROUP BY 1
+      ON CONFLICT (customer_id) DO UPDATE
+        SET max_ts = GREATEST(customer_watermarks.max_ts, EXCLUDED.max_ts), updated_at = EXCLUDED.updated_at
+    """), {"cid": customer_id})
+
+    res = await src.execute(text("""
+      SELECT period, kwh_total, cost_total, due_amount, paid FROM billing WHERE customer_id = :cid
+    """), {"cid": customer_id})
+    for row in res.mappings().all():
+        await dst.execute(text("""
+          INSERT INTO billing (customer_id, period, kwh_total, cost_total, due_amount, paid)
+          VALUES (:cid, :period, :kwh_total, :cost_total, :due_amount, :paid)
+          ON CONFLICT (customer_id, period) DO NOTHING
+        """), {"cid": customer_id, **row})
+
+    res = await src.execute(text("""
+      SELECT period, kwh_before, kwh_after, cost_before, cost_after, readings_added, restated_at
+      FROM billing_restatements WHERE customer_id = :cid
+    """), {"cid": customer_id})
+    for row in res.mappings().all():
+        await dst.execute(text("""
+          INSERT INTO billing_restatements
+            (billing_id, customer_id, period, kwh_before, kwh_after, cost_before, cost_after, readings_added, restated_at)
+          SELECT b.id, :cid, :period, :kwh_before, :kwh_after, :cost_before, :cost_after, :readings_added, :restated_at
+          FROM billing b
+          WHERE b.customer_id = :cid AND b.period = :period
+            AND NOT EXISTS (
+              SELECT 1 FROM billing_restatements r
+              WHERE r.customer_id = :cid AND r.period = :period AND r.restated_at = :restated_at
+            )
+        """), {"cid": customer_id, **row})
+
+    res = await src.execute(text("SELECT amount, ts FROM payments WHERE customer_id = :cid"), {"cid": customer_id})
+    for row in res.mappings().all():
+        await dst.execute(text("""
+          INSERT INTO payments (customer_id, amount, ts)
+          SELECT :cid, :amount, :ts
+          WHERE NOT EXISTS (
+            SELECT 1 FROM payments WHERE customer_id = :cid AND ts = :ts AND amount = :amount
+          )
+        """), {"cid": customer_id, **row})
+    return readings
+
+
+async def delete_customer(session: AsyncSession, customer_id: int) -> None:
+    params = {"cid": customer_id}
+    await session.execute(text("""
+      DELETE FROM ml_outputs mo USING meter_readings mr
+      WHERE mo.reading_id = mr.id AND mr.customer_id = :cid
+    """), params)
+    for table in ("scoring_queue", "meter_readings", "meter_channel_readings", "usage_rollups", "demand_sketch_bins",
+                  "customer_watermarks", "billing_restatements", "billing", "payments"):
+        await session.execute(text(f"DELETE FROM {table} WHERE customer_id = :cid"), params)
+
+
+async def reading_count(session: AsyncSession, customer_id: int) -> int:
+    res = await session.execute(
+        text("SELECT COUNT(*) FROM meter_readings WHERE customer_id = :cid"), {"cid": customer_id})
+    return int(res.scalar())
+
+
+async def run(command: str, old_spec: str) -> None:
+    old_layout = parse_shards(old_spec)
+    new_layout = parse_shards(SHARD_URLS)
+    # One engine per shard name across both layouts
+    urls = dict(old_layout)
+    urls.update(new_layout)
+    everything = ShardSet(list(urls.items()))
+    old = ShardSet(old_layout)
+    new = ShardSet(new_layout)
+    index = {name: i for i, name in enumerate(everything.names)}
+
+    moves = await plan(old, new)
+    for customer_id, src, dst in moves:
+        print(f"customer {customer_id}: {src} -> {dst}")
+    if command == "plan":
+        print(f"{len(moves)} customer(s) to move")
+        return
+
+    for customer_id, src_name, dst_name in moves:
+        async with everything.sessionmakers[index[src_name]]() as src, \
+                everything.sessionmakers[index[dst_name]]() as dst:
+            if command == "copy":
+                async with dst.begin():
+                    copied = await copy_customer(src, dst, customer_id)
+                print(f"customer {customer_id}: copied {copied} reading(s) to {dst_name}")
+            else:
+                have, need = await reading_count(dst, customer_id), await reading_count(src, customer_id)
+                if have < need:
+                    print(f"customer {customer_id}: {dst_name} has {have}/{need} readings, run copy first")
+                    continue
+                async with src.begin():
+                    await delete_customer(src, customer_id)
+                print(f"customer {customer_id}: removed from {src_name}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from", dest="old", required=True, help="previous SHARD_URLS value")
+    parser.add_argument("command", choices=["plan", "copy", "cleanup"])
+    args = parser.parse_args()
+    asyncio.run(run(args.command, args.old))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# Incremental usage rollups and billing restatement for late readings
+from collections import Counter
+from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+from .ml import estimate_cost
+
+BUCKET = "15 minutes"
+
+
+async def fold(session: AsyncSession, customer_ids: list[int], ts: list[datetime], kwh: list[float]) -> None:
+    """Add newly stored readings into their 15-minute buckets.
+
+    Only the buckets the readings fall in are touched, whether the readings
+    are current or days late.
+    """
+    await session.execute(
+        text(f"""
+          INSERT INTO usage_rollups (customer_id, bucket, kwh, readings)
+          SELECT customer_id, date_bin('{BUCKET}', ts, TIMESTAMP '2000-01-01'), SUM(kwh), COUNT(*)
+          FROM unnest(
+            CAST(:customer_id AS integer[]),
+            CAST(:ts AS timestamp[]),
+            CAST(:kwh AS double precision[])
+          ) AS r(customer_id, ts, kwh)
+          GROUP BY 1, 2
+          ON CONFLICT (customer_id, bucket) DO UPDATE
+            SET kwh = usage_rollups.kwh + EXCLUDED.kwh,
+                readings = usage_rollups.readings + EXCLUDED.readings
+        """),
+        {"customer_id": customer_ids, "ts": ts, "kwh": kwh},
+    )
+
+
+async def restate(session: AsyncSession, readings: list[tuple[int, datetime]]) -> int:
+    """Recompute already-billed periods that newly stored readings fall into.
+
+    Each (customer, month) that has a billing row is re-totalled from
+    usage_rollups, the billing row is trued up and the change is recorded
+    in billing_restatements. Periods without a billing row are left alone;
+    they will be billed from the rollups when they close. The lookup is
+    one indexed join per batch, so it runs for every batch, not only for
+    readings behind the watermark.
+    """
+    affected = Counter((customer_id, t.strftime("%Y-%m")) for customer_id, t in readings)
+    res = await session.execute(
+        text("""
+          SELECT b.id, b.customer_id, b.period, b.kwh_total, b.cost_total,
+                 (SELECT COALESCE(SUM(u.kwh), 0) FROM usage_rollups u
+                  WHERE u.customer_id = b.customer_id
+                    AND u.bucket >= TO_DATE(b.period, 'YYYY-MM')
+                    AND u.bucket < TO_DATE(b.period, 'YYYY-MM') + INTERVAL '1 month') AS kwh_now
+          FROM billing b
+          JOIN unnest(CAST(:customer_id AS integer[]), CAST(:period AS text[])) AS a(customer_id, period)
+            ON a.customer_id = b.customer_id AND a.period = b.period
+          FOR UPDATE OF b
+        """),
+        {"customer_id": [c for c, _ in affected], "period": [p for _, p in affected]},
+    )
+    restated = 0
+    for billing_id, customer_id, period, kwh_before, cost_before, kwh_now in res.all():
+        if kwh_now == kwh_before:
+            continue
+        cost_now = estimate_cost(kwh_now)
+        await session.execute(
+            text("""
+              UPDATE billing
+              SET kwh_total = :kwh, cost_total = :cost,
+                  due_amount = due_amount + (:cost - cost_total),
+                  paid = paid AND :cost <= cost_total
+              WHERE id = :id
+            """),
+            {"id": billing_id, "kwh": kwh_now, "cost": cost_now},
+        )
+        await session.execute(
+            text("""
+              INSERT INTO billing_restatements
+                (billing_id, customer_id, period, kwh_before, kwh_after, cost_before, cost_after, readings_added)
+              VALUES (:billing_id, :cid, :period, :kwh_before, :kwh_after, :cost_before, :cost_after, :added)
+            """),
+            {"billing_id": billing_id, "cid": customer_id, "period": period,
+             "kwh_before": kwh_before, "kwh_after": kwh_now,
+             "cost_before": cost_before, "cost_after": cost_now,
+             "added": affected[(customer_id, period)]},
+        )
+        restated += 1
+    return restated
@@ -1,24 +1,47 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
-from ..db import get_session
-from ..schemas import AnalyticsOut
+from ..db import ShardSet, get_shards
+from ..schemas import AnalyticsOut, PercentilesOut, DemandOut, RecentOut
+from ..ratelimit import limit_per_client
+from .. import sketches, demand
+from ..cache import TTLCache
+from ..conditional import conditional
+from ..watermarks import watermarks
+from ..hotwindow import hot, from_database
+from datetime import date, datetime
+from typing import Optional, List
+import asyncio
+import numpy as np
+import os
+import time
 
-router = APIRouter()
+router = APIRouter(dependencies=[Depends(limit_per_client("analytics"))])
+
+# Closed periods only change through late readings, so they are cached longer than the open one
+DEMAND_TTL_OPEN = float(os.getenv("DEMAND_CACHE_TTL_OPEN", "60"))
+DEMAND_TTL_CLOSED = float(os.getenv("DEMAND_CACHE_TTL_CLOSED", "3600"))
+demand_cache = TTLCache(maxsize=int(os.getenv("DEMAND_CACHE_SIZE", "10000")), ttl=DEMAND_TTL_OPEN)
+
+def shards_for(shards: ShardSet, customer_id: Optional[int]) -> list[int]:
+    # A customer's data lives on one shard; fleet-wide queries hit all of them
+    return list(range(len(shards))) if customer_id is None else [shards.index_for(customer_id)]
 
 @router.get("/usage/latest")
-async def latest(session: AsyncSession = Depends(get_session)):
+async def latest(shards: ShardSet = Depends(get_shards)):
     # Simplified: latest reading with derived cost
-    res = await session.execute(text("""
-      SELECT mr.ts as timestamp, mr.customer_id, mr.kwh, 
-             COALESCE(mo.predicted_cost, mr.kwh * 0.18) as cost,
-             mr.voltage, mr.current, mo.notes
-      FROM meter_readings mr
-      LEFT JOIN ml_outputs mo ON mo.reading_id = mr.id
-      ORDER BY mr.ts DESC LIMIT 1
-    """))
-    row = res.mappings().first()
-    if not row:
+    async def query(session: AsyncSession):
+        res = await session.execute(text("""
+          SELECT mr.ts as timestamp, mr.customer_id, mr.kwh,
+                 COALESCE(mo.predicted_cost, mr.kwh * 0.18) as cost,
+                 mr.voltage, mr.current, mo.notes
+          FROM meter_readings mr
+          LEFT JOIN ml_outputs mo ON mo.reading_id = mr.id
+          ORDER BY mr.ts DESC LIMIT 1
+        """))
+        return res.mappings().first()
+    rows = [r for r in await shards.scatter(query) if r]
+    if not rows:
         return {
           "timestamp": "",
           "customer_id": "n/a",
@@ -28,30 +51,169 @@ async def latest(session: AsyncSession = Depends(get_session)):
           "current": None,
           "notes": None
         }
-    return dict(row)
+    return dict(max(rows, key=lambda r: r["timestamp"]))
+
+@router.get("/usage/recent", response_model=RecentOut)
+async def recent_usage(
+    customer_id: int = Query(...),
+    hours: int = Query(24, ge=1, le=max(1, hot.span_seconds // 3600)),
+    granularity: str = Query("hourly", pattern="^(hourly|daily)$"),
+    shards: ShardSet = Depends(get_shards)
+):
+    # Buckets up to and including the current (partial) hour or UTC day, from the hot window
+    width = 3600 if granularity == "hourly" else 86400
+    count = -(-hours * 3600 // width)
+    end = (int(time.time()) // width + 1) * width
+    start = end - count * width
+
+    ring = await hot.ensure(shards, customer_id, start)
+    if ring is not None:
+        source, buckets = "memory", ring.buckets(start, width, count)
+    else:
+        async with shards.session_for(customer_id) as session:
+            source, buckets = "database", await from_database(session, customer_id, start, width, count)
+
+    def value(x):
+        return None if np.isnan(x) else round(float(x), 3)
+
+    stamps = (start + np.arange(count) * width).astype("datetime64[s]")
+    periods = np.datetime_as_string(stamps, unit="m" if granularity == "hourly" else "D")
+    return {
+      "customer_id": customer_id,
+      "granularity": granularity,
+      "start": str(np.datetime64(start, "s")),
+      "end": str(np.datetime64(end, "s")),
+      "source": source,
+      "points": [
+        {"period": str(p), "kwh": float(k), "readings": int(n), "voltage": value(v), "current": value(c)}
+        for p, k, n, v, c in zip(periods, buckets["kwh"], buckets["readings"], buckets["voltage"], buckets["current"])
+      ],
+    }
 
 @router.get("/analytics", response_model=AnalyticsOut)
 async def analytics(
+    request: Request,
     granularity: str = Query("daily", pattern="^(daily|monthly|yearly)$"),
-    session: AsyncSession = Depends(get_session)
+    customer_id: Optional[int] = Query(None),
+    breakdown: Optional[str] = Query(None, pattern="^channel$"),
+    shards: ShardSet = Depends(get_shards)
 ):
     bucket = {
       "daily": "DATE_TRUNC('day', ts)",
       "monthly": "DATE_TRUNC('month', ts)",
       "yearly": "DATE_TRUNC('year', ts)",
     }[granularity]
+    fmt = {"daily": "YYYY-MM-DD", "monthly": "YYYY-MM", "yearly": "YYYY"}[granularity]
+    params = {"cid": customer_id}
+
+    async def query(session: AsyncSession):
+        res = await session.execute(text(f"""
+          SELECT TO_CHAR({bucket}, '{fmt}') AS period,
+          SUM(kwh) AS kwh,
+          SUM(COALESCE(mo.predicted_cost, mr.kwh*0.18)) AS cost
+          FROM meter_readings mr
+          LEFT JOIN ml_outputs mo ON mo.reading_id = mr.id
+          WHERE CAST(:cid AS integer) IS NULL OR mr.customer_id = :cid
+          GROUP BY 1
+        """), params)
+        totals = res.all()
+        channels = []
+        if breakdown == "channel":
+            # One grouped scan of the channel table, merged into the totals by period
+            res = await session.execute(text(f"""
+              SELECT TO_CHAR({bucket}, '{fmt}') AS period, channel, SUM(kwh) AS kwh
+              FROM meter_channel_readings
+              WHERE CAST(:cid AS integer) IS NULL OR customer_id = :cid
+              GROUP BY 1, 2
+            """), params)
+            channels = res.all()
+        return totals, channels
+
+    async def build():
+        # Per-shard partial sums are merged by period
+        merged: dict[str, dict] = {}
+        for totals, channels in await shards.scatter(query, shards_for(shards, customer_id)):
+            for period, kwh, cost in totals:
+                point = merged.setdefault(period, {"period": period, "kwh": 0.0, "cost": 0.0})
+                point["kwh"] += kwh
+                point["cost"] += cost
+                if breakdown == "channel":
+                    point.setdefault("channels", {})
+            for period, channel, kwh in channels:
+                point = merged.setdefault(period, {"period": period, "kwh": 0.0, "cost": 0.0, "channels": {}})
+                point["channels"][channel] = point["channels"].get(channel, 0.0) + kwh
+        return {"points": [merged[p] for p in sorted(merged)]}
+
+    return await conditional(request, shards, [customer_id], AnalyticsOut, build)
+
+@router.get("/analytics/percentiles", response_model=PercentilesOut)
+async def percentiles(
+    request: Request,
+    start: date = Query(...),
+    end: date = Query(...),
+    customer_id: Optional[List[int]] = Query(None),
+    q: str = Query("0.5,0.95,0.99", pattern=r"^(0(\.\d+)?|1(\.0+)?)(,(0(\.\d+)?|1(\.0+)?))*$"),
+    shards: ShardSet = Depends(get_shards)
+):
+    # Answered from sketches alone: per-reading kW demand quantiles within sketches.ALPHA relative error
+    if end < start:
+        raise HTTPException(status_code=400, detail="end is before start")
+    qs = [float(x) for x in q.split(",")]
+    months, days = sketches.split_range(start, end)
+
+    if customer_id:
+        groups = {i: [customer_id[p] for p in positions]
+                  for i, positions in shards.partition(customer_id).items()}
+    else:
+        groups = {i: None for i in range(len(shards))}
+
+    async def query(index: int, ids: Optional[List[int]]):
+        async with shards.sessionmakers[index]() as session:
+            return await sketches.merged_bins(session, ids, months, days)
+
+    async def build():
+        bins: dict[int, int] = {}
+        for partial in await asyncio.gather(*(query(i, ids) for i, ids in groups.items())):
+            for b, n in partial.items():
+                bins[b] = bins.get(b, 0) + n
+        values = sketches.quantiles(bins, qs)
+        return {
+          "start": start.isoformat(),
+          "end": end.isoformat(),
+          "customers": sorted(set(customer_id)) if customer_id else None,
+          "count": sum(bins.values()),
+          "relative_error": sketches.ALPHA,
+          "quantiles": {f"p{q * 100:g}": v for q, v in zip(qs, values)},
+        }
+
+    return await conditional(request, shards, customer_id or [None], PercentilesOut, build)
+
+@router.get("/analytics/demand", response_model=DemandOut)
+async def demand_profile(
+    request: Request,
+    customer_id: int = Query(...),
+    period: str = Query(..., pattern=r"^\d{4}-(0[1-9]|1[0-2])$"),
+    points: int = Query(21, ge=2, le=201),
+    shards: ShardSet = Depends(get_shards)
+):
+    # Peak 15/30/60-minute demand and load-duration curve for one billing period
+    async def build():
+        # Keyed on the persisted change stamp so new or late readings are never masked by the TTL
+        stamp = (await watermarks.stamps(shards, [customer_id]))[customer_id]
+        key = (customer_id, period, points, stamp)
+        cached = demand_cache.get(key)
+        if cached is not None:
+            return cached
+
+        start, end = demand.period_bounds(period)
+        async with shards.session_for(customer_id) as session:
+            interval = await demand.reading_interval(session, customer_id, start, end)
+            peaks = await demand.peaks(session, customer_id, start, end, interval)
+            curve = await demand.load_duration(session, customer_id, start, end, points, interval)
+        result = {"customer_id": customer_id, "period": period, "interval_minutes": interval,
+                  "peaks": peaks, "load_duration": curve}
+        closed = end <= datetime.utcnow()
+        demand_cache.set(key, result, DEMAND_TTL_CLOSED if closed else DEMAND_TTL_OPEN)
+        return result
 
-    res = await session.execute(text(f"""
-      SELECT TO_CHAR({bucket}, CASE 
-        WHEN '{granularity}'='daily' THEN 'YYYY-MM-DD'
-        WHEN '{granularity}'='monthly' THEN 'YYYY-MM'
-        ELSE 'YYYY'
-      END) AS period,
-      SUM(kwh) AS kwh,
-      SUM(COALESCE(mo.predicted_cost, mr.kwh*0.18)) AS cost
-      FROM meter_readings mr
-      LEFT JOIN ml_outputs mo ON mo.reading_id = mr.id
-      GROUP BY 1 ORDER BY 1 ASC
-    """))
-    points = [dict(r) for r in res.mappings().all()]
-    return {"points": points}
+    return await conditional(request, shards, [customer_id], DemandOut, build)
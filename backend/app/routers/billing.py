@@ -1,26 +1,27 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
-from ..db import get_session
+from ..db import ShardSet, get_session, get_shards
 from ..schemas import PaymentIn, ContactIn
 from datetime import datetime, timedelta
 
 router = APIRouter()
 
 @router.get("/billing/current")
-async def billing_current(session: AsyncSession = Depends(get_session)):
+async def billing_current(shards: ShardSet = Depends(get_shards)):
     # Simplified demo: compute due amount from latest period totals minus payments
     # This example assumes single customer ID 1 for demo purposes
-    res = await session.execute(text("""
-      WITH usage_totals AS (
-        SELECT DATE_TRUNC('month', ts) AS period, SUM(kwh) AS kwh
-        FROM meter_readings WHERE customer_id = 1
-        GROUP BY 1 ORDER BY 1 DESC LIMIT 1
-      )
-      SELECT 
-        COALESCE((SELECT kwh FROM usage_totals), 0) * 0.18 AS due_amount
-    """))
-    due_amount = float(res.scalar() or 0.0)
+    async with shards.session_for(1) as session:
+        res = await session.execute(text("""
+          WITH usage_totals AS (
+            SELECT DATE_TRUNC('month', ts) AS period, SUM(kwh) AS kwh
+            FROM meter_readings WHERE customer_id = 1
+            GROUP BY 1 ORDER BY 1 DESC LIMIT 1
+          )
+          SELECT
+            COALESCE((SELECT kwh FROM usage_totals), 0) * 0.18 AS due_amount
+        """))
+        due_amount = float(res.scalar() or 0.0)
     return {
       "customer_id": 1,
       "due_amount": round(due_amount, 2),
@@ -29,13 +30,30 @@ async def billing_current(session: AsyncSession = Depends(get_session)):
       "last_payment_date": None,
     }
 
+@router.get("/billing/restatements")
+async def billing_restatements(
+    customer_id: int = Query(...),
+    shards: ShardSet = Depends(get_shards)
+):
+    # Audit trail of billed periods recomputed after readings arrived for them
+    async with shards.session_for(customer_id) as session:
+        res = await session.execute(text("""
+          SELECT period, kwh_before, kwh_after, cost_before, cost_after, readings_added, restated_at
+          FROM billing_restatements WHERE customer_id = :cid
+          ORDER BY restated_at DESC LIMIT 100
+        """), {"cid": customer_id})
+        rows = [dict(r) for r in res.mappings().all()]
+    return {"customer_id": customer_id, "restatements": rows}
+
 @router.post("/payments")
-async def create_payment(payload: PaymentIn, session: AsyncSession = Depends(get_session)):
-    await session.execute(
-        text("INSERT INTO payments (customer_id, amount, ts) VALUES (:cid, :amount, NOW())"),
-        {"cid": payload.customer_id or 1, "amount": payload.amount},
-    )
-    await session.commit()
+async def create_payment(payload: PaymentIn, shards: ShardSet = Depends(get_shards)):
+    customer_id = payload.customer_id or 1
+    async with shards.session_for(customer_id) as session:
+        await session.execute(
+            text("INSERT INTO payments (customer_id, amount, ts) VALUES (:cid, :amount, NOW())"),
+            {"cid": customer_id, "amount": payload.amount},
+        )
+        await session.commit()
     return {"status": "ok"}
 
 @router.post("/contact")
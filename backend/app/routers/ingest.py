@@ -1,42 +1,242 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
-from ..db import get_session
+from ..db import ShardSet, get_shards
 from ..schemas import IngestReading, LiveUsageOut
-from ..ml import estimate_cost, detect_anomaly
+from ..frames import (
+    CONTENT_TYPE as FRAME_CONTENT_TYPE, MAX_FRAME_BYTES, FrameError, FrameHeader, decode_frame, decode_header,
+    header_length,
+)
+from ..dedup import fingerprints, recent
+from ..metrics import counters
+from ..ratelimit import enforce_all
+from ..watermarks import watermarks
+from ..rollups import fold, restate
+from ..hotwindow import hot
+from .. import sketches
+from collections import Counter
+import asyncio
+import numpy as np
 import os
 
 router = APIRouter()
 
 API_KEY = os.getenv("INGEST_API_KEY", "dev-key")
 
-@router.post("/ingest", response_model=dict)
-async def ingest(payload: IngestReading, session: AsyncSession = Depends(get_session)):
-    if payload.api_key != API_KEY:
-        raise HTTPException(status_code=401, detail="Unauthorized")
+COLUMNS = ("customer_id", "ts", "kwh", "voltage", "current")
 
-    # Insert raw reading
-    await session.execute(
-        text("""
-          INSERT INTO meter_readings (customer_id, ts, kwh, voltage, current)
-          VALUES (:customer_id, :ts, :kwh, :voltage, :current)
-        """),
-        payload.model_dump(),
+def admit(api_key: str, customer_ids: list[int]) -> None:
+    # One token per reading, against the key and against each customer; all or nothing
+    enforce_all(
+        [("ingest_key", api_key, len(customer_ids))]
+        + [("ingest_customer", customer_id, n) for customer_id, n in Counter(customer_ids).items()]
     )
-    await session.commit()
 
-    # Run placeholder ML and store result
-    cost = estimate_cost(payload.kwh)
-    anomaly, notes = detect_anomaly(payload.kwh)
+async def store_channels(session: AsyncSession, rows: dict[str, list], inserted: list) -> None:
+    # Channel rows follow their reading: only readings that were actually inserted
+    by_key = {
+        key: channels
+        for key, channels in zip(zip(rows["customer_id"], rows["ts"]), rows["channels"])
+        if channels
+    }
+    flat = {"customer_id": [], "ts": [], "channel": [], "kwh": []}
+    for _, customer_id, ts, *_ in inserted:
+        for channel, kwh in by_key.get((customer_id, ts), {}).items():
+            flat["customer_id"].append(customer_id)
+            flat["ts"].append(ts)
+            flat["channel"].append(channel)
+            flat["kwh"].append(kwh)
+    if not flat["channel"]:
+        return
     await session.execute(
         text("""
-          INSERT INTO ml_outputs (reading_id, predicted_cost, anomaly, notes)
-          VALUES (
-            currval(pg_get_serial_sequence('meter_readings','id')),
-            :cost, :anomaly, :notes
+          INSERT INTO meter_channel_readings (customer_id, ts, channel, kwh)
+          SELECT * FROM unnest(
+            CAST(:customer_id AS integer[]),
+            CAST(:ts AS timestamp[]),
+            CAST(:channel AS varchar[]),
+            CAST(:kwh AS double precision[])
           )
+          ON CONFLICT (customer_id, ts, channel) DO NOTHING
         """),
-        {"cost": cost, "anomaly": anomaly, "notes": notes},
+        flat,
     )
+
+async def stored_fingerprints(session: AsyncSession, rows: dict[str, list], inserted: list) -> dict:
+    """Value fingerprint of the stored row for every key in `rows`.
+
+    Inserted rows come back from RETURNING; only keys that collided are read back.
+    """
+    stored = {}
+    if inserted:
+        _, customer_ids, ts, kwh, voltage, current = zip(*inserted)
+        stored.update(zip(zip(customer_ids, ts), fingerprints(kwh, voltage, current)))
+    missing = list({key for key in zip(rows["customer_id"], rows["ts"]) if key not in stored})
+    if missing:
+        res = await session.execute(
+            text("""
+              SELECT r.customer_id, r.ts, r.kwh, r.voltage, r.current
+              FROM meter_readings r
+              JOIN unnest(CAST(:customer_id AS integer[]), CAST(:ts AS timestamp[])) AS k(customer_id, ts)
+                ON k.customer_id = r.customer_id AND k.ts = r.ts
+            """),
+            {"customer_id": [c for c, _ in missing], "ts": [t for _, t in missing]},
+        )
+        found = res.all()
+        if found:
+            _, _, kwh, voltage, current = zip(*found)
+            stored.update(zip(((c, t) for c, t, *_ in found), fingerprints(kwh, voltage, current)))
+    return stored
+
+async def store_readings(session: AsyncSession, rows: dict[str, list]) -> dict:
+    """Insert column arrays idempotently on (customer_id, ts); the first write wins.
+
+    Exact resends the in-memory filter already knows are dropped before the
+    round trip; anything else that collides is skipped by ON CONFLICT. A
+    collision whose values differ from the stored row is a rejected
+    correction, counted apart from true duplicates. ML scoring happens later
+    in the scoring worker.
+    """
+    received = len(rows["customer_id"])
+    fps = fingerprints(rows["kwh"], rows["voltage"], rows["current"])
+    keep = np.flatnonzero(~recent.seen(rows["customer_id"], rows["ts"], fps)).tolist()
+    if len(keep) < received:
+        rows = {c: [values[i] for i in keep] for c, values in rows.items()}
+        fps = fps[keep]
+
+    inserted, corrections = [], 0
+    keys, known, winners = [], [], np.zeros(0, dtype=np.int64)
+    if keep:
+        res = await session.execute(
+            text("""
+              WITH inserted AS (
+                INSERT INTO meter_readings (customer_id, ts, kwh, voltage, current)
+                SELECT * FROM unnest(
+                  CAST(:customer_id AS integer[]),
+                  CAST(:ts AS timestamp[]),
+                  CAST(:kwh AS double precision[]),
+                  CAST(:voltage AS double precision[]),
+                  CAST(:current AS double precision[])
+                )
+                ON CONFLICT (customer_id, ts) DO NOTHING
+                RETURNING id, customer_id, ts, kwh, voltage, current
+              ), queued AS (
+                INSERT INTO scoring_queue (reading_id, customer_id, kwh)
+                SELECT id, customer_id, kwh FROM inserted
+              )
+              SELECT * FROM inserted
+            """),
+            {c: rows[c] for c in COLUMNS},
+        )
+        inserted = res.all()
+        if rows.get("channels"):
+            await store_channels(session, rows, inserted)
+        stored = await stored_fingerprints(session, rows, inserted)
+        keys = list(zip(rows["customer_id"], rows["ts"]))
+        known = [i for i, key in enumerate(keys) if key in stored]
+        winners = np.array([stored[keys[i]] for i in known], dtype=np.int64)
+        corrections = int(np.count_nonzero(winners != fps[known]))
+
+    # Fold new readings into rollups, then restate any period already billed.
+    # Restatement keys on the billing row, not on lateness: a meter that was
+    # offline across a month end is ahead of its own watermark when it catches up.
+    advanced, late_readings = {}, []
+    if inserted:
+        _, customer_ids, ts, kwh, _, _ = zip(*inserted)
+        late, advanced = await watermarks.classify(session, customer_ids, ts)
+        await fold(session, list(customer_ids), list(ts), list(kwh))
+        await sketches.record(session, customer_ids, ts, kwh)
+        late_readings = [(c, t) for c, t, is_late in zip(customer_ids, ts, late) if is_late]
+        counters["ingest_late_readings"] += len(late_readings)
+        counters["billing_periods_restated"] += await restate(session, list(zip(customer_ids, ts)))
+        # Every customer with new rows gets a fresh updated_at, which analytics ETags are built from
+        newest: dict = {}
+        for customer_id, t in zip(customer_ids, ts):
+            if customer_id not in newest or t > newest[customer_id]:
+                newest[customer_id] = t
+        await watermarks.persist(session, newest)
+
     await session.commit()
-    return {"status": "ok"}
+    watermarks.publish(advanced)
+    if keep:
+        # Every key that reached the database now exists there; remember the values that won
+        recent.remember([keys[i][0] for i in known], [keys[i][1] for i in known], winners)
+    if inserted:
+        # Drop this process's cached stamps so its own writes show at once (see conditional.py)
+        watermarks.bump({customer_id for _, customer_id, *_ in inserted})
+        _, customer_ids, ts, kwh, voltage, current = zip(*inserted)
+        hot.push(customer_ids, ts, kwh, voltage, current)
+
+    duplicates = received - len(inserted) - corrections
+    counters["ingest_readings_received"] += received
+    counters["ingest_readings_inserted"] += len(inserted)
+    counters["ingest_duplicates_filtered"] += received - len(keep)
+    counters["ingest_duplicates_conflicted"] += len(keep) - len(inserted) - corrections
+    counters["ingest_corrections_rejected"] += corrections
+    return {"status": "ok", "inserted": len(inserted), "duplicates": duplicates,
+            "corrections": corrections, "late": len(late_readings)}
+
+async def store_sharded(shards: ShardSet, rows: dict[str, list]) -> dict:
+    """Split rows by customer shard and store each part in parallel.
+
+    Each shard commits on its own; if one fails the request errors and the
+    client's retry is absorbed by the idempotent insert on the others.
+    """
+    async def store(index: int, positions: list[int] | None) -> dict:
+        part = rows if positions is None else {c: [v[p] for p in positions] for c, v in rows.items()}
+        async with shards.sessionmakers[index]() as session:
+            return await store_readings(session, part)
+
+    groups = shards.partition(rows["customer_id"])
+    if len(groups) == 1:
+        return await store(next(iter(groups)), None)
+    results = await asyncio.gather(*(store(i, positions) for i, positions in groups.items()))
+    totals = {k: sum(r[k] for r in results) for k in ("inserted", "duplicates", "corrections", "late")}
+    return {"status": "ok", **totals}
+
+@router.post("/ingest", response_model=dict)
+async def ingest(payload: IngestReading, shards: ShardSet = Depends(get_shards)):
+    if payload.api_key != API_KEY:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    admit(payload.api_key, [payload.customer_id])
+
+    reading = payload.model_dump()
+    return await store_sharded(shards, {c: [reading[c]] for c in COLUMNS + ("channels",)})
+
+async def read_frame(request: Request) -> tuple[FrameHeader, bytes]:
+    """Read a frame body, refusing it as soon as it is too large or its api_key is wrong."""
+    too_large = HTTPException(status_code=413, detail=f"Frame exceeds {MAX_FRAME_BYTES} bytes")
+    length = request.headers.get("content-length")
+    if length is not None and (not length.isdigit() or int(length) > MAX_FRAME_BYTES):
+        raise too_large
+    data, header = bytearray(), None
+    async for chunk in request.stream():
+        data += chunk
+        if len(data) > MAX_FRAME_BYTES:
+            raise too_large
+        needed = header_length(data) if header is None else None
+        if needed is not None and len(data) >= needed:
+            # Authenticate on the header alone, before the records are read or unpacked
+            header = decode_header(data)
+            if header.api_key != API_KEY:
+                raise HTTPException(status_code=401, detail="Unauthorized")
+    if header is None:
+        # The body ended inside the header; this raises FrameError
+        decode_header(data)
+    return header, bytes(data)
+
+@router.post("/ingest/frame", response_model=dict)
+async def ingest_frame(request: Request, shards: ShardSet = Depends(get_shards)):
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type != FRAME_CONTENT_TYPE:
+        raise HTTPException(status_code=415, detail=f"Expected {FRAME_CONTENT_TYPE}")
+    try:
+        header, data = await read_frame(request)
+        frame = decode_frame(data, header)
+    except FrameError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if not len(frame):
+        return {"status": "ok", "inserted": 0, "duplicates": 0, "corrections": 0, "late": 0}
+    admit(frame.api_key, frame.customer_id)
+
+    return await store_sharded(shards, frame.columns())
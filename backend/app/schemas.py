@@ -1,13 +1,31 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List
+from pydantic import BaseModel, Field, field_validator
+from typing import Optional, List, Dict
+from datetime import datetime, timezone
 
 class IngestReading(BaseModel):
   api_key: str
   customer_id: int
-  ts: str
+  ts: datetime
   kwh: float
   voltage: Optional[float] = None
   current: Optional[float] = None
+  # Submetered appliance channels, e.g. {"AC_Unit": 0.2, "Fan": 0.1}
+  channels: Optional[Dict[str, float]] = Field(None, max_length=32)
+
+  @field_validator("channels")
+  @classmethod
+  def channel_names(cls, v: Optional[Dict[str, float]]) -> Optional[Dict[str, float]]:
+    if v and any(not 0 < len(name) <= 32 for name in v):
+      raise ValueError("channel names must be 1-32 characters")
+    return v
+
+  @field_validator("ts")
+  @classmethod
+  def naive_utc(cls, v: datetime) -> datetime:
+    # meter_readings.ts is a naive UTC timestamp; (customer_id, ts) is the natural key
+    if v.tzinfo is not None:
+      v = v.astimezone(timezone.utc).replace(tzinfo=None)
+    return v
 
 class LiveUsageOut(BaseModel):
   timestamp: str
@@ -22,10 +40,50 @@ class AnalyticsPoint(BaseModel):
   period: str
   kwh: float
   cost: float
+  channels: Optional[Dict[str, float]] = None
 
 class AnalyticsOut(BaseModel):
   points: List[AnalyticsPoint]
 
+class PercentilesOut(BaseModel):
+  start: str
+  end: str
+  customers: Optional[List[int]] = None
+  count: int
+  relative_error: float
+  quantiles: Dict[str, Optional[float]]
+
+class DemandPeak(BaseModel):
+  window_minutes: int
+  kw: float
+  start: str
+
+class LoadDurationPoint(BaseModel):
+  percent_of_time: float
+  kw: float
+
+class DemandOut(BaseModel):
+  customer_id: int
+  period: str
+  interval_minutes: int
+  peaks: List[DemandPeak]
+  load_duration: List[LoadDurationPoint]
+
+class RecentPoint(BaseModel):
+  period: str
+  kwh: float
+  readings: int
+  voltage: Optional[float] = None
+  current: Optional[float] = None
+
+class RecentOut(BaseModel):
+  customer_id: int
+  granularity: str
+  start: str
+  end: str
+  source: str
+  points: List[RecentPoint]
+
 class BillingOut(BaseModel):
   customer_id: int | str
   due_amount: float
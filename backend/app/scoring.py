@@ -0,0 +1,126 @@
+# Batched ML scoring of stored readings, off the request path
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from sqlalchemy import text
+from .db import AsyncSessionLocal, shards
+from .ml import score_batch
+from .metrics import counters, gauge
+from .watermarks import watermarks
+import asyncio
+import logging
+import os
+import time
+
+BATCH_SIZE = int(os.getenv("SCORING_BATCH_SIZE", "500"))
+CONCURRENCY = int(os.getenv("SCORING_CONCURRENCY", "2"))
+IDLE_SECONDS = float(os.getenv("SCORING_IDLE_SECONDS", "1.0"))
+EXECUTOR = os.getenv("SCORING_EXECUTOR", "thread")  # thread | process
+
+log = logging.getLogger(__name__)
+
+
+class ScoringWorker:
+    """Claims queued readings in batches and writes ml_outputs.
+
+    Ingest adds each stored reading to scoring_queue, a narrow table holding
+    what scoring needs. Each of `concurrency` tasks deletes up to
+    `batch_size` queue rows with FOR UPDATE SKIP LOCKED, so tasks (and other
+    API processes) never score the same row twice, and meter_readings is
+    never rewritten. The delete commits with the ml_outputs insert, so a
+    failed batch stays queued. Scoring runs in a thread or process pool so the
+    event loop is never blocked on model CPU. Until a reading is scored,
+    analytics fall back to kwh * 0.18.
+    """
+
+    def __init__(self, sessionmaker=AsyncSessionLocal, batch_size: int = BATCH_SIZE,
+                 concurrency: int = CONCURRENCY, executor: str = EXECUTOR):
+        self.sessionmaker = sessionmaker
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.executor_kind = executor
+        self.pool: Executor | None = None
+        self.tasks: list[asyncio.Task] = []
+        self.lag_seconds = 0.0
+        self.last_batch_at = time.monotonic()
+
+    async def score_once(self) -> int:
+        loop = asyncio.get_running_loop()
+        async with self.sessionmaker() as session:
+            async with session.begin():
+                res = await session.execute(
+                    text("""
+                      WITH claimed AS (
+                        DELETE FROM scoring_queue
+                        WHERE reading_id IN (
+                          SELECT reading_id FROM scoring_queue
+                          ORDER BY reading_id LIMIT :n FOR UPDATE SKIP LOCKED
+                        )
+                        RETURNING reading_id, customer_id, kwh, queued_at
+                      )
+                      SELECT reading_id, customer_id, kwh, EXTRACT(EPOCH FROM LOCALTIMESTAMP - queued_at) AS lag
+                      FROM claimed
+                    """),
+                    {"n": self.batch_size},
+                )
+                rows = res.all()
+                if not rows:
+                    self.lag_seconds = 0.0
+                    return 0
+                ids, customer_ids, kwh, lags = zip(*rows)
+                costs, anomalies, notes = await loop.run_in_executor(self.pool, score_batch, list(kwh))
+                await session.execute(
+                    text("""
+                      INSERT INTO ml_outputs (reading_id, predicted_cost, anomaly, notes)
+                      SELECT * FROM unnest(
+                        CAST(:reading_id AS integer[]),
+                        CAST(:cost AS double precision[]),
+                        CAST(:anomaly AS boolean[]),
+                        CAST(:notes AS text[])
+                      )
+                      ON CONFLICT (reading_id) DO NOTHING
+                    """),
+                    {"reading_id": list(ids), "cost": costs, "anomaly": anomalies, "notes": notes},
+                )
+                # Scores replace the kwh * 0.18 fallback in analytics costs
+                await watermarks.touch(session, customer_ids)
+        watermarks.bump(set(customer_ids))
+        self.lag_seconds = float(max(lags))
+        self.last_batch_at = time.monotonic()
+        counters["scoring_batches"] += 1
+        counters["scoring_readings_scored"] += len(rows)
+        return len(rows)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                scored = await self.score_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Scoring batch failed; it will be retried")
+                counters["scoring_errors"] += 1
+                scored = 0
+            if scored < self.batch_size:
+                await asyncio.sleep(IDLE_SECONDS)
+
+    def start(self) -> None:
+        if self.executor_kind == "process":
+            self.pool = ProcessPoolExecutor(max_workers=self.concurrency)
+        else:
+            self.pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="scoring")
+        self.tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+
+# One worker per shard; each claims only from its own database
+workers = [ScoringWorker(sm) for sm in shards.sessionmakers]
+gauge("scoring_lag_seconds", lambda: max(w.lag_seconds for w in workers))
+gauge("scoring_seconds_since_batch",
+      lambda: round(time.monotonic() - min(w.last_batch_at for w in workers), 3))
@@ -0,0 +1,357 @@
+"""Synthetic meter fleet for load-testing ingest.
+
+Each virtual meter is a household built from the hour-of-day appliance
+profile in analytics/september_2025_hourly_patterns.csv. It gets its own
+appliance scales, a time shift, appliance ownership and per-reading noise,
+all drawn from a generator seeded with --seed and its customer id, so a run
+can be reproduced exactly. Meters read every --step seconds of simulated
+time starting at --start, so every reading has a fresh (customer_id, ts)
+key. The fleet as a whole is paced to --rate readings per second of wall
+time.
+
+Run from backend/ against a running API:
+
+    python -m app.simulate --url http://localhost:8000 --meters 5000 --rate 2000 --duration 60
+    python -m app.simulate --transport frame --batch 96 --meters 2000 --rate 20000
+
+Transports:
+
+    json   one reading per POST /api/ingest, with per-appliance channels
+    frame  --batch readings per POST /api/ingest/frame (app/frames.py)
+
+Readings for customers that do not exist fail on the foreign key, so create
+them first, e.g. for --first-customer 1 --meters 5000:
+
+    INSERT INTO customers (id, email, name)
+    SELECT g, 'meter' || g || '@example.test', 'Meter ' || g FROM generate_series(1, 5000) g
+    ON CONFLICT DO NOTHING;
+
+Set RATE_LIMIT_INGEST_KEY and RATE_LIMIT_INGEST_CUSTOMER to "off" on the
+server unless the limiter itself is under test; 429s count as errors.
+
+Requests go over a fixed pool of HTTP/1.1 keep-alive connections
+(--connections). Latency is measured from when a request was due, not when
+it got a connection, so a saturated server shows up as latency rather than
+as a quietly lower send rate.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import math
+import os
+import random
+import ssl
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from urllib.parse import urlsplit
+from .frames import CONTENT_TYPE as FRAME_CONTENT_TYPE, encode_frame
+
+DEFAULT_PROFILE = Path(__file__).resolve().parents[2] / "analytics" / "september_2025_hourly_patterns.csv"
+# Share of households that own each appliance; anything else is always owned
+OWNERSHIP = {"AC_Unit": 0.7, "Heater": 0.5}
+
+
+def load_profile(path: Path) -> dict[str, list[float]]:
+    """Mean watts per appliance for each hour of the day, from the hourly patterns CSV."""
+    with open(path, newline="") as f:
+        rows = sorted(csv.DictReader(f), key=lambda r: int(r["Hour"]))
+    if len(rows) != 24:
+        raise ValueError(f"{path}: expected 24 hourly rows, found {len(rows)}")
+    appliances = [c[:-len("_Power_W")] for c in rows[0] if c.endswith("_Power_W") and c != "Total_Power_W"]
+    return {a: [float(r[f"{a}_Power_W"]) for r in rows] for a in appliances}
+
+
+class Household:
+    """One simulated meter: a seeded variation on the fleet profile."""
+
+    def __init__(self, customer_id: int, profile: dict[str, list[float]], seed: int):
+        self.customer_id = customer_id
+        self.profile = profile
+        self.rng = random.Random(seed * 1_000_003 + customer_id)
+        self.shift = self.rng.uniform(-2.0, 2.0)
+        self.scale = {
+            a: self.rng.lognormvariate(0.0, 0.35) if self.rng.random() < OWNERSHIP.get(a, 1.0) else 0.0
+            for a in profile
+        }
+        self.nominal_voltage = self.rng.gauss(230.0, 3.0)
+
+    def watts(self, hour: float) -> dict[str, float]:
+        # Linear interpolation between hourly means, shifted per household, with per-reading noise
+        h = (hour + self.shift) % 24
+        lo = int(h)
+        frac = h - lo
+        out = {}
+        for a, curve in self.profile.items():
+            mean = curve[lo] * (1 - frac) + curve[(lo + 1) % 24] * frac
+            out[a] = max(0.0, mean * self.scale[a] * self.rng.gauss(1.0, 0.15))
+        return out
+
+    def reading(self, ts: datetime, step: float) -> tuple:
+        """(customer_id, ts, kwh, voltage, current, channels) for the interval ending at ts."""
+        watts = self.watts(ts.hour + ts.minute / 60)
+        hours = step / 3600
+        channels = {a: round(w * hours / 1000, 6) for a, w in watts.items()}
+        total_w = sum(watts.values())
+        voltage = round(self.rng.gauss(self.nominal_voltage, 1.5), 1)
+        current = round(total_w / voltage, 2)
+        return self.customer_id, ts, round(sum(channels.values()), 6), voltage, current, channels
+
+
+class HTTPError(Exception):
+    pass
+
+
+class Connection:
+    """Minimal HTTP/1.1 keep-alive client connection."""
+
+    def __init__(self, host: str, port: int, tls: bool):
+        self.host, self.port, self.tls = host, port, tls
+        self.reader: asyncio.StreamReader | None = None
+        self.writer: asyncio.StreamWriter | None = None
+
+    async def request(self, method: str, path: str, body: bytes, content_type: str) -> tuple[int, bytes]:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port, ssl=ssl.create_default_context() if self.tls else None)
+        head = (
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+            f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+            f"Connection: keep-alive\r\n\r\n"
+        )
+        try:
+            self.writer.write(head.encode("latin-1") + body)
+            await self.writer.drain()
+            status, headers = await self._read_head()
+            if headers.get("transfer-encoding", "").lower() == "chunked":
+                payload = await self._read_chunked()
+            else:
+                payload = await self.reader.readexactly(int(headers.get("content-length", "0")))
+        except (OSError, asyncio.IncompleteReadError, HTTPError):
+            await self.close()
+            raise
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, payload
+
+    async def _read_head(self) -> tuple[int, dict[str, str]]:
+        lines = (await self.reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        parts = lines[0].split(" ", 2)
+        if len(parts) < 2 or not parts[0].startswith("HTTP/1."):
+            raise HTTPError(f"Bad status line {lines[0]!r}")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        return int(parts[1]), headers
+
+    async def _read_chunked(self) -> bytes:
+        body = bytearray()
+        while True:
+            size = int((await self.reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            if not size:
+                await self.reader.readuntil(b"\r\n")
+                return bytes(body)
+            body += await self.reader.readexactly(size)
+            await self.reader.readexactly(2)
+
+    async def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+
+@dataclass
+class Stats:
+    requests: int = 0
+    readings: int = 0
+    errors: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    corrections: int = 0
+    statuses: Counter = field(default_factory=Counter)
+    latencies: list[float] = field(default_factory=list)
+
+    def record(self, status: int | str, latency: float, readings: int, body: bytes = b"") -> None:
+        self.requests += 1
+        self.readings += readings
+        self.statuses[str(status)] += 1
+        self.latencies.append(latency)
+        if status != 200:
+            self.errors += 1
+            return
+        try:
+            result = json.loads(body)
+            self.inserted += result.get("inserted", 0)
+            self.duplicates += result.get("duplicates", 0)
+            self.corrections += result.get("corrections", 0)
+        except ValueError:
+            pass
+
+    def summary(self, elapsed: float) -> dict:
+        ordered = sorted(self.latencies)
+
+        def pct(q: float) -> float | None:
+            if not ordered:
+                return None
+            return round(ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)] * 1000, 2)
+
+        return {
+            "elapsed_seconds": round(elapsed, 2),
+            "requests": self.requests,
+            "readings": self.readings,
+            "requests_per_second": round(self.requests / elapsed, 1) if elapsed else 0.0,
+            "readings_per_second": round(self.readings / elapsed, 1) if elapsed else 0.0,
+            "inserted": self.inserted,
+            "duplicates": self.duplicates,
+            "corrections": self.corrections,
+            "errors": self.errors,
+            "error_rate": round(self.errors / self.requests, 4) if self.requests else 0.0,
+            "statuses": dict(self.statuses),
+            "latency_ms": {"p50": pct(0.5), "p90": pct(0.9), "p99": pct(0.99), "p999": pct(0.999),
+                           "max": pct(1.0)},
+        }
+
+
+class Fleet:
+    def __init__(self, args: argparse.Namespace):
+        url = urlsplit(args.url)
+        self.tls = url.scheme == "https"
+        self.host = url.hostname or "localhost"
+        self.port = url.port or (443 if self.tls else 80)
+        self.base = url.path.rstrip("/")
+        self.args = args
+        profile = load_profile(args.profile)
+        self.households = [
+            Household(args.first_customer + i, profile, args.seed) for i in range(args.meters)
+        ]
+        self.pool: asyncio.Queue[Connection] = asyncio.Queue()
+        for _ in range(args.connections):
+            self.pool.put_nowait(Connection(self.host, self.port, self.tls))
+        self.stats = Stats()
+
+    def payload(self, readings: list[tuple]) -> tuple[str, bytes, str]:
+        if self.args.transport == "frame":
+            epoch = datetime(1970, 1, 1)
+            records = ((cid, (ts - epoch).total_seconds(), kwh, v, a) for cid, ts, kwh, v, a, _ in readings)
+            return f"{self.base}/api/ingest/frame", encode_frame(self.args.api_key, records), FRAME_CONTENT_TYPE
+        cid, ts, kwh, voltage, current, channels = readings[0]
+        body = {"api_key": self.args.api_key, "customer_id": cid, "ts": ts.isoformat(), "kwh": kwh,
+                "voltage": voltage, "current": current, "channels": channels}
+        return f"{self.base}/api/ingest", json.dumps(body).encode(), "application/json"
+
+    async def send(self, readings: list[tuple], due: float) -> None:
+        path, body, content_type = self.payload(readings)
+        conn = await self.pool.get()
+        try:
+            status, response = await conn.request("POST", path, body, content_type)
+            self.stats.record(status, time.perf_counter() - due, len(readings), response)
+        except (OSError, asyncio.IncompleteReadError, HTTPError) as exc:
+            self.stats.record(type(exc).__name__, time.perf_counter() - due, len(readings))
+        finally:
+            self.pool.put_nowait(conn)
+
+    async def meter(self, household: Household, started: float, deadline: float) -> None:
+        # Each meter sends one request every `interval` seconds at a random phase,
+        # so the fleet as a whole arrives at --rate readings per second
+        args = self.args
+        per_request = args.batch if args.transport == "frame" else 1
+        interval = args.meters * per_request / args.rate
+        due = started + household.rng.uniform(0, interval)
+        ts = args.start
+        inflight: set[asyncio.Task] = set()
+        while due < deadline:
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            readings = []
+            for _ in range(per_request):
+                ts += timedelta(seconds=args.step)
+                readings.append(household.reading(ts, args.step))
+            # Open loop: a slow response does not delay this meter's next request
+            task = asyncio.create_task(self.send(readings, due))
+            inflight.add(task)
+            task.add_done_callback(inflight.discard)
+            due += interval
+        if inflight:
+            await asyncio.gather(*inflight)
+
+    async def report_progress(self, started: float) -> None:
+        while True:
+            await asyncio.sleep(self.args.report_every)
+            s = self.stats
+            elapsed = time.perf_counter() - started
+            print(f"[{elapsed:6.1f}s] {s.requests} requests, {s.readings} readings "
+                  f"({s.readings / elapsed:.0f}/s), {s.errors} errors", file=sys.stderr)
+
+    async def run(self) -> dict:
+        started = time.perf_counter()
+        deadline = started + self.args.duration
+        progress = asyncio.create_task(self.report_progress(started)) if self.args.report_every else None
+        try:
+            await asyncio.gather(*(self.meter(h, started, deadline) for h in self.households))
+        finally:
+            if progress:
+                progress.cancel()
+            while not self.pool.empty():
+                await self.pool.get_nowait().close()
+        return self.stats.summary(time.perf_counter() - started)
+
+
+def _start(value: str) -> datetime:
+    ts = datetime.fromisoformat(value)
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000", help="API base URL")
+    parser.add_argument("--api-key", default=os.getenv("INGEST_API_KEY", "dev-key"))
+    parser.add_argument("--transport", choices=["json", "frame"], default="json")
+    parser.add_argument("--batch", type=int, default=96, help="readings per frame (frame transport)")
+    parser.add_argument("--meters", type=int, default=1000, help="virtual meters")
+    parser.add_argument("--first-customer", type=int, default=1, help="customer id of the first meter")
+    parser.add_argument("--rate", type=float, default=500.0, help="target readings per second, whole fleet")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to send for")
+    parser.add_argument("--connections", type=int, default=64, help="keep-alive connections")
+    parser.add_argument("--step", type=float, default=900.0, help="simulated seconds between readings")
+    parser.add_argument("--start", type=_start, default=None,
+                        help="simulated time of the first reading (ISO 8601, UTC); default 30 days ago")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--profile", type=Path, default=DEFAULT_PROFILE, help="hourly patterns CSV")
+    parser.add_argument("--report-every", type=float, default=5.0, help="progress interval in seconds, 0 for none")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+    if args.meters < 1 or args.rate <= 0 or args.connections < 1 or args.batch < 1:
+        parser.error("--meters, --rate, --connections and --batch must be positive")
+    if args.start is None:
+        now = datetime.now(timezone.utc).replace(tzinfo=None, minute=0, second=0, microsecond=0)
+        args.start = now - timedelta(days=30)
+
+    summary = asyncio.run(Fleet(args).run())
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    latency = summary["latency_ms"]
+    print(f"{summary['requests']} requests, {summary['readings']} readings in {summary['elapsed_seconds']}s")
+    print(f"throughput  {summary['requests_per_second']} req/s, {summary['readings_per_second']} readings/s"
+          f" (target {args.rate:g})")
+    print(f"stored      {summary['inserted']} inserted, {summary['duplicates']} duplicates, "
+          f"{summary['corrections']} corrections rejected")
+    print(f"errors      {summary['errors']} ({summary['error_rate']:.2%})  statuses {summary['statuses']}")
+    print("latency ms  " + "  ".join(f"{k} {v}" for k, v in latency.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+# Mergeable quantile sketches of per-reading demand
+"""
+A reading's demand is its average kW: kWh over the time since the
+customer's previous reading, so 15-minute and hourly meters at the same load
+record the same value. A reading with no previous one within MAX_INTERVAL
+(the customer's first, or the first after an outage) is taken to cover one
+rollup bucket, DEFAULT_INTERVAL.
+
+Relative-error log-bucket sketch (the DDSketch construction).
+
+A positive value v lands in bin ceil(log_gamma(v)) with
+gamma = (1 + ALPHA) / (1 - ALPHA), and a bin is represented by
+2 * gamma**bin / (gamma + 1). Every quantile answered from the bins is then
+within ALPHA relative error of the exact quantile of the recorded values.
+Values at or below MIN_VALUE (including zero and export readings) share
+ZERO_BIN and are reported as 0.
+
+A sketch is a map of bin -> count, so merging two sketches is adding their
+counts. That is why they live in demand_sketch_bins as plain rows: merging
+customers, days and months is a SUM(count) ... GROUP BY bin. Memory per
+bucket is bounded by the number of distinct bins: at most
+log_gamma(MAX / MIN_VALUE) + 1, about 1,150 for values between 1e-6 and
+1e4 kW with ALPHA = 1%.
+
+Sketches are kept per customer per day ('d') and per month ('m'). Queries
+read whole months from the monthly rows and only the edge days from the
+daily rows.
+"""
+from collections import Counter
+from datetime import date, datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+import math
+
+ALPHA = 0.01
+GAMMA = (1 + ALPHA) / (1 - ALPHA)
+MIN_VALUE = 1e-6
+ZERO_BIN = -(2**31)
+_LOG_GAMMA = math.log(GAMMA)
+DEFAULT_INTERVAL = timedelta(minutes=15)
+MAX_INTERVAL = timedelta(days=1)
+
+
+def demand_kw(kwh: float, interval: timedelta | None) -> float:
+    if interval is None or interval > MAX_INTERVAL:
+        interval = DEFAULT_INTERVAL
+    return kwh * 3600 / interval.total_seconds()
+
+
+def bin_for(value: float) -> int:
+    if value <= MIN_VALUE:
+        return ZERO_BIN
+    return math.ceil(math.log(value) / _LOG_GAMMA)
+
+
+def bin_value(b: int) -> float:
+    if b == ZERO_BIN:
+        return 0.0
+    return 2 * GAMMA ** b / (GAMMA + 1)
+
+
+def quantiles(bins: dict[int, int], qs: list[float]) -> list[float | None]:
+    """Quantiles of a merged sketch; None when it is empty."""
+    total = sum(bins.values())
+    if not total:
+        return [None for _ in qs]
+    ordered = sorted(bins.items())
+    out = []
+    for q in qs:
+        rank = q * (total - 1)
+        seen = 0
+        for b, count in ordered:
+            seen += count
+            if seen > rank:
+                out.append(bin_value(b))
+                break
+    return out
+
+
+def split_range(start: date, end: date) -> tuple[list[date], list[date]]:
+    """Cover [start, end] inclusive with whole months plus the leftover days."""
+    months, days = [], []
+    d = start
+    while d <= end:
+        month_start = d.replace(day=1)
+        next_month = (month_start + timedelta(days=32)).replace(day=1)
+        if d == month_start and next_month - timedelta(days=1) <= end:
+            months.append(month_start)
+            d = next_month
+        else:
+            days.append(d)
+            d += timedelta(days=1)
+    return months, days
+
+
+async def _upsert(session: AsyncSession, counts: Counter) -> None:
+    if not counts:
+        return
+    rows = {"customer_id": [], "granularity": [], "bucket": [], "bin": [], "count": []}
+    for (customer_id, granularity, bucket, b), n in counts.items():
+        rows["customer_id"].append(customer_id)
+        rows["granularity"].append(granularity)
+        rows["bucket"].append(bucket)
+        rows["bin"].append(b)
+        rows["count"].append(n)
+    await session.execute(
+        text("""
+          INSERT INTO demand_sketch_bins (customer_id, granularity, bucket, bin, count)
+          SELECT * FROM unnest(
+            CAST(:customer_id AS integer[]),
+            CAST(:granularity AS char(1)[]),
+            CAST(:bucket AS date[]),
+            CAST(:bin AS integer[]),
+            CAST(:count AS bigint[])
+          )
+          ON CONFLICT (customer_id, granularity, bucket, bin) DO UPDATE
+            SET count = demand_sketch_bins.count + EXCLUDED.count
+        """),
+        rows,
+    )
+
+
+def _count(counts: Counter, customer_ids, ts, kwh, previous) -> None:
+    for customer_id, t, value, before in zip(customer_ids, ts, kwh, previous):
+        b = bin_for(demand_kw(value, None if before is None else t - before))
+        day = t.date()
+        counts[(customer_id, "d", day, b)] += 1
+        counts[(customer_id, "m", day.replace(day=1), b)] += 1
+
+
+async def _previous(session: AsyncSession, customer_ids, ts) -> list[datetime | None]:
+    # Stored readings include the batch itself (this runs after the insert)
+    res = await session.execute(
+        text("""
+          SELECT p.ts FROM unnest(CAST(:customer_id AS integer[]), CAST(:ts AS timestamp[]))
+               WITH ORDINALITY AS k(customer_id, ts, i)
+          LEFT JOIN LATERAL (
+            SELECT r.ts FROM meter_readings r
+            WHERE r.customer_id = k.customer_id AND r.ts < k.ts AND r.ts >= k.ts - CAST(:max AS interval)
+            ORDER BY r.ts DESC LIMIT 1
+          ) p ON TRUE
+          ORDER BY k.i
+        """),
+        {"customer_id": list(customer_ids), "ts": list(ts), "max": MAX_INTERVAL},
+    )
+    return [row[0] for row in res.all()]
+
+
+async def record(session: AsyncSession, customer_ids: list[int], ts: list[datetime], kwh: list[float]) -> None:
+    """Add newly stored readings' demand to their daily and monthly sketches."""
+    counts: Counter = Counter()
+    _count(counts, customer_ids, ts, kwh, await _previous(session, customer_ids, ts))
+    await _upsert(session, counts)
+
+
+async def rebuild(session: AsyncSession, customer_id: int, page: int = 10_000) -> None:
+    """Recompute a customer's sketches from meter_readings (used after moving shards)."""
+    await session.execute(text("DELETE FROM demand_sketch_bins WHERE customer_id = :cid"), {"cid": customer_id})
+    counts: Counter = Counter()
+    after = None
+    while True:
+        res = await session.execute(
+            text("""
+              SELECT ts, kwh FROM meter_readings
+              WHERE customer_id = :cid AND (CAST(:after AS timestamp) IS NULL OR ts > :after)
+              ORDER BY ts LIMIT :n
+            """),
+            {"cid": customer_id, "after": after, "n": page},
+        )
+        rows = res.all()
+        if rows:
+            ts, kwh = zip(*rows)
+            # Pages are in ts order, so each reading's predecessor is the row before it
+            _count(counts, [customer_id] * len(rows), ts, kwh, (after,) + ts[:-1])
+        if len(rows) < page:
+            break
+        after = rows[-1][0]
+    await _upsert(session, counts)
+
+
+async def merged_bins(session: AsyncSession, customer_ids: list[int] | None,
+                      months: list[date], days: list[date]) -> dict[int, int]:
+    res = await session.execute(
+        text("""
+          SELECT bin, SUM(count) FROM demand_sketch_bins
+          WHERE (CAST(:cids AS integer[]) IS NULL OR customer_id = ANY(CAST(:cids AS integer[])))
+            AND ((granularity = 'm' AND bucket = ANY(CAST(:months AS date[])))
+              OR (granularity = 'd' AND bucket = ANY(CAST(:days AS date[]))))
+          GROUP BY bin
+        """),
+        {"cids": customer_ids, "months": months, "days": days},
+    )
+    return {b: int(n) for b, n in res.all()}
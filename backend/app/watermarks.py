@@ -0,0 +1,156 @@
+# Per-customer event-time watermarks for late-arrival detection
+from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+from .cache import TTLCache
+from .db import ShardSet
+import asyncio
+import os
+
+# Readings older than the customer's newest reading by more than this are late
+LATE_TOLERANCE = timedelta(seconds=int(os.getenv("LATE_TOLERANCE_SECONDS", "3600")))
+# How long a process trusts its copy of a customer's persisted change time
+STAMP_REFRESH = float(os.getenv("VALIDATOR_REFRESH_SECONDS", "2"))
+# Change time of a customer with no stored data
+NEVER = datetime(1970, 1, 1)
+# updated_at is naive UTC, like meter_readings.ts
+CHANGED_NOW = "clock_timestamp() AT TIME ZONE 'UTC'"
+
+
+class Watermarks:
+    """Newest reading timestamp seen per customer.
+
+    Every batch re-reads its customers' marks from customer_watermarks
+    inside the ingest transaction, so API processes never classify
+    against each other's stale copies. Advances are persisted in that
+    transaction and published to the in-memory copy only after it commits.
+
+    customer_watermarks.updated_at doubles as the customer's persisted data
+    version: every transaction that changes a customer's stored data (new
+    or late readings, restated billing, fresh ML scores) sets it to
+    clock_timestamp() under the row lock, so it only moves forward and
+    every API process reads the same value. Rows are locked in customer_id
+    order so ingest and scoring never deadlock. `stamps` caches it for
+    STAMP_REFRESH seconds (None stands for the whole fleet: the newest
+    change on any shard); `bump` drops this process's copies after its own
+    commits so it sees its writes at once.
+    """
+
+    def __init__(self, refresh: float = STAMP_REFRESH):
+        self._marks: dict[int, datetime] = {}
+        self._stamps = TTLCache(maxsize=100_000, ttl=refresh)
+
+    def get(self, customer_id: int) -> datetime | None:
+        return self._marks.get(customer_id)
+
+    async def _load(self, session: AsyncSession, customer_ids: set[int]) -> None:
+        res = await session.execute(
+            text("SELECT customer_id, max_ts FROM customer_watermarks WHERE customer_id = ANY(:ids)"),
+            {"ids": list(customer_ids)},
+        )
+        for customer_id, max_ts in res.all():
+            mark = self._marks.get(customer_id)
+            if mark is None or max_ts > mark:
+                self._marks[customer_id] = max_ts
+
+    async def classify(
+        self, session: AsyncSession, customer_ids: list[int], ts: list[datetime]
+    ) -> tuple[list[bool], dict[int, datetime]]:
+        """Return a late flag per reading and the advanced marks to persist."""
+        await self._load(session, set(customer_ids))
+        late = []
+        advanced: dict[int, datetime] = {}
+        for customer_id, t in zip(customer_ids, ts):
+            mark = self._marks.get(customer_id)
+            late.append(mark is not None and t < mark - LATE_TOLERANCE)
+            newest = advanced.get(customer_id, mark)
+            if newest is None or t > newest:
+                advanced[customer_id] = t
+        return late, advanced
+
+    async def persist(self, session: AsyncSession, newest: dict[int, datetime]) -> None:
+        """Advance marks to each customer's newest stored reading and stamp them as changed."""
+        if not newest:
+            return
+        customer_ids = sorted(newest)
+        await session.execute(
+            text(f"""
+              INSERT INTO customer_watermarks (customer_id, max_ts, updated_at)
+              SELECT *, {CHANGED_NOW} FROM unnest(CAST(:customer_id AS integer[]), CAST(:max_ts AS timestamp[]))
+              ON CONFLICT (customer_id) DO UPDATE
+                SET max_ts = GREATEST(customer_watermarks.max_ts, EXCLUDED.max_ts),
+                    updated_at = {CHANGED_NOW}
+            """),
+            {"customer_id": customer_ids, "max_ts": [newest[c] for c in customer_ids]},
+        )
+
+    async def touch(self, session: AsyncSession, customer_ids) -> None:
+        """Stamp customers whose derived data changed without new readings (e.g. ML scores)."""
+        await session.execute(
+            text(f"""
+              UPDATE customer_watermarks w SET updated_at = {CHANGED_NOW}
+              FROM (
+                SELECT customer_id FROM customer_watermarks WHERE customer_id = ANY(:ids)
+                ORDER BY customer_id FOR UPDATE
+              ) locked
+              WHERE w.customer_id = locked.customer_id
+            """),
+            {"ids": sorted(set(customer_ids))},
+        )
+
+    def publish(self, advanced: dict[int, datetime]) -> None:
+        for customer_id, t in advanced.items():
+            mark = self._marks.get(customer_id)
+            if mark is None or t > mark:
+                self._marks[customer_id] = t
+
+    def bump(self, customer_ids) -> None:
+        """Record that these customers' data changed (call after commit)."""
+        for customer_id in set(customer_ids):
+            self._stamps.delete(customer_id)
+        if customer_ids:
+            self._stamps.delete(None)
+
+    async def stamps(self, shards: ShardSet, customer_ids) -> dict[int | None, datetime]:
+        """Persisted last-change time of each customer (None: the whole fleet)."""
+        out: dict[int | None, datetime] = {}
+        missing = []
+        for customer_id in set(customer_ids):
+            stamp = self._stamps.get(customer_id)
+            if stamp is None:
+                missing.append(customer_id)
+            else:
+                out[customer_id] = stamp
+        if missing:
+            out.update(await self._fetch_stamps(shards, missing))
+            for customer_id in missing:
+                self._stamps.set(customer_id, out[customer_id])
+        return out
+
+    async def _fetch_stamps(self, shards: ShardSet, keys: list[int | None]) -> dict[int | None, datetime]:
+        ids = [c for c in keys if c is not None]
+        groups = {i: [ids[p] for p in positions] for i, positions in shards.partition(ids).items()}
+        if None in keys:
+            groups = {i: groups.get(i, []) for i in range(len(shards))}
+
+        async def query(index: int, customer_ids: list[int]):
+            async with shards.sessionmakers[index]() as session:
+                res = await session.execute(
+                    text("""
+                      SELECT customer_id, updated_at FROM customer_watermarks WHERE customer_id = ANY(:ids)
+                      UNION ALL
+                      SELECT NULL, MAX(updated_at) FROM customer_watermarks WHERE :fleet
+                    """),
+                    {"ids": customer_ids, "fleet": None in keys},
+                )
+                return res.all()
+
+        out: dict[int | None, datetime] = {c: NEVER for c in keys}
+        for rows in await asyncio.gather(*(query(i, c) for i, c in groups.items())):
+            for customer_id, updated_at in rows:
+                if updated_at is not None and updated_at > out[customer_id]:
+                    out[customer_id] = updated_at
+        return out
+
+
+watermarks = Watermarks()
@@ -0,0 +1,47 @@
+from datetime import datetime
+
+import pytest
+
+from app.frames import FrameError, decode_frame, decode_header, encode_frame
+
+RECORDS = [
+    (1, 1_700_000_000, 1.2345, 230.1, 5.25),
+    (42, 1_700_000_900, 0.0, None, None),
+]
+
+# Written out from the spec in app/frames.py, not produced by the encoder
+GOLDEN = bytes.fromhex(
+    "534d4631" "01" "00" "0200" "02000000" "6b31"  # SMF1, v1, flags, key_len 2, count 2, "k1"
+    "01000000" "00f15365" "39300000" "fd08" "0d02"  # 1, 1700000000, 12345, 2301, 525
+    "2a000000" "84f45365" "00000000" "ffff" "ffff"  # 42, 1700000900, 0, absent, absent
+)
+
+
+def test_encode_matches_golden_vector():
+    assert encode_frame("k1", RECORDS) == GOLDEN
+
+
+def test_decode_golden_vector():
+    frame = decode_frame(GOLDEN)
+    assert frame.api_key == "k1"
+    assert frame.customer_id == [1, 42]
+    assert frame.ts == [datetime(2023, 11, 14, 22, 13, 20), datetime(2023, 11, 14, 22, 28, 20)]
+    assert frame.kwh == [1.2345, 0.0]
+    assert frame.voltage == [230.1, None]
+    assert frame.current == [5.25, None]
+
+
+def test_header_decodes_without_records():
+    header = decode_header(GOLDEN[:14])
+    assert (header.api_key, header.count, header.offset, header.size) == ("k1", 2, 14, len(GOLDEN))
+
+
+@pytest.mark.parametrize("data", [GOLDEN[:10], GOLDEN[:-1], GOLDEN + b"\0"])
+def test_decode_rejects_wrong_length(data):
+    with pytest.raises(FrameError):
+        decode_frame(data)
+
+
+def test_encode_rejects_out_of_range_customer():
+    with pytest.raises(FrameError):
+        encode_frame("k1", [(2**31, 0, 0.0, None, None)])
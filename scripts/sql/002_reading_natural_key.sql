@@ -0,0 +1,17 @@
+/* (customer_id, ts) is the natural key of a meter reading; retries must not duplicate rows */
+
+-- Drop duplicates left by earlier blind inserts, keeping the first row of each key
+DELETE FROM ml_outputs mo
+USING meter_readings mr
+WHERE mo.reading_id = mr.id
+  AND EXISTS (
+    SELECT 1 FROM meter_readings keep
+    WHERE keep.customer_id = mr.customer_id AND keep.ts = mr.ts AND keep.id < mr.id
+  );
+
+DELETE FROM meter_readings mr
+USING meter_readings keep
+WHERE keep.customer_id = mr.customer_id AND keep.ts = mr.ts AND keep.id < mr.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS meter_readings_customer_ts_key
+  ON meter_readings (customer_id, ts);
@@ -0,0 +1,20 @@
+/* Submetered per-appliance channels (AC_Unit, Fan, Heater, ...) stored next to the total reading */
+
+-- Narrow table keyed like meter_readings so breakdowns never join back to it
+CREATE TABLE IF NOT EXISTS meter_channel_readings (
+  customer_id INTEGER NOT NULL REFERENCES customers(id),
+  ts TIMESTAMP NOT NULL,
+  channel VARCHAR(32) NOT NULL,
+  kwh DOUBLE PRECISION NOT NULL,
+  PRIMARY KEY (customer_id, ts, channel)
+);
+
+SELECT create_hypertable('meter_channel_readings', 'ts', if_not_exists => TRUE);
+
+-- Compress closed chunks segmented per customer and channel
+ALTER TABLE meter_channel_readings SET (
+  timescaledb.compress,
+  timescaledb.compress_segmentby = 'customer_id, channel',
+  timescaledb.compress_orderby = 'ts'
+);
+SELECT add_compression_policy('meter_channel_readings', INTERVAL '7 days', if_not_exists => TRUE);
@@ -0,0 +1,24 @@
+/* ML scoring runs off the request path: ingest queues new readings in a narrow table */
+
+-- When each reading was stored; the scoring lag and hot-window resyncs read it
+ALTER TABLE meter_readings ADD COLUMN IF NOT EXISTS ingested_at TIMESTAMP NOT NULL DEFAULT LOCALTIMESTAMP;
+
+-- Claimed with DELETE ... RETURNING, so the hypertable is never updated to mark progress
+CREATE TABLE IF NOT EXISTS scoring_queue (
+  reading_id INTEGER PRIMARY KEY,
+  customer_id INTEGER NOT NULL,
+  kwh DOUBLE PRECISION NOT NULL,
+  queued_at TIMESTAMP NOT NULL DEFAULT LOCALTIMESTAMP
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS ml_outputs_reading_key ON ml_outputs (reading_id);
+
+-- Queue readings stored before the worker existed that have no score yet
+INSERT INTO scoring_queue (reading_id, customer_id, kwh, queued_at)
+SELECT mr.id, mr.customer_id, mr.kwh, mr.ingested_at FROM meter_readings mr
+WHERE NOT EXISTS (SELECT 1 FROM ml_outputs mo WHERE mo.reading_id = mr.id)
+ON CONFLICT (reading_id) DO NOTHING;
+
+-- An earlier revision of this migration queued by a flag on meter_readings
+DROP INDEX IF EXISTS meter_readings_unscored_idx;
+ALTER TABLE meter_readings DROP COLUMN IF EXISTS scored;
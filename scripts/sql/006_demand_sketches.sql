@@ -0,0 +1,36 @@
+/* Mergeable demand (kW) quantile sketches (log-bucket counts) per customer per day and month */
+
+CREATE TABLE IF NOT EXISTS demand_sketch_bins (
+  customer_id INTEGER NOT NULL REFERENCES customers(id),
+  granularity CHAR(1) NOT NULL, -- 'd' day, 'm' month
+  bucket DATE NOT NULL,         -- the day, or the first day of the month
+  bin INTEGER NOT NULL,
+  count BIGINT NOT NULL,
+  PRIMARY KEY (customer_id, granularity, bucket, bin)
+);
+
+-- Fleet-wide queries filter on time first
+CREATE INDEX IF NOT EXISTS demand_sketch_bins_bucket_idx ON demand_sketch_bins (granularity, bucket);
+
+-- Backfill from existing readings; must match app/sketches.py demand_kw and bin_for
+-- (DEFAULT_INTERVAL = 15 minutes, MAX_INTERVAL = 1 day, ALPHA = 0.01, MIN_VALUE = 1e-6)
+WITH gaps AS (
+  SELECT customer_id, ts, kwh,
+         EXTRACT(EPOCH FROM ts - LAG(ts) OVER (PARTITION BY customer_id ORDER BY ts)) AS seconds
+  FROM meter_readings
+), demand AS (
+  SELECT customer_id, ts,
+         kwh * 3600 / CASE WHEN seconds IS NULL OR seconds > 86400 THEN 900 ELSE seconds END AS kw
+  FROM gaps
+), binned AS (
+  SELECT customer_id, ts::date AS day,
+         CASE WHEN kw <= 1e-6 THEN -2147483648
+              ELSE CEIL(LN(kw) / LN((1 + 0.01::double precision) / (1 - 0.01)))::integer
+         END AS bin
+  FROM demand
+)
+INSERT INTO demand_sketch_bins (customer_id, granularity, bucket, bin, count)
+SELECT customer_id, 'd', day, bin, COUNT(*) FROM binned GROUP BY 1, 2, 3, 4
+UNION ALL
+SELECT customer_id, 'm', DATE_TRUNC('month', day)::date, bin, COUNT(*) FROM binned GROUP BY 1, 2, 3, 4
+ON CONFLICT (customer_id, granularity, bucket, bin) DO NOTHING;